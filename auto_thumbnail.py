@@ -1,14 +1,19 @@
 import os
 import random
 import subprocess
-from contextlib import contextmanager
-from moviepy import VideoFileClip
-from PIL import Image
-import cv2
-import numpy as np
-from flask import Flask, render_template_string, request, jsonify, send_file
-import tempfile
-import shutil
+from flask import Flask, Response, render_template_string, request, jsonify, send_file
+import json
+import io
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from job_queue import JobQueue, QueueFullError, new_job_id
+from preview_store import PreviewStore
+from dir_index import DirectoryIndex
+from result_cache import ResultCache
+from metrics import REGISTRY, Counter, Histogram, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Flask应用初始化
 app = Flask(__name__)
@@ -19,6 +24,23 @@ TEMP_DIR = "/tmp/thumbnails"
 
 SUPPORTED_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm"]
 
+# 每个视频抽取的候选帧数量
+CANDIDATE_COUNT = 5
+
+# 后台生成任务的并发数与最大排队数
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 32
+
+# 批量生成使用的进程数
+BATCH_WORKERS = os.cpu_count() or 2
+
+# 内存预览缓存的最大字节数
+PREVIEW_CACHE_BYTES = 64 * 1024 * 1024
+
+# 生成结果缓存的数据库位置与图片总大小上限
+RESULT_CACHE_DB = os.path.join(TEMP_DIR, "results.db")
+RESULT_CACHE_BYTES = 512 * 1024 * 1024
+
 # 确保临时目录存在
 os.makedirs(TEMP_DIR, exist_ok=True)
 
@@ -32,124 +54,142 @@ def check_ffmpeg():
         return False
 
 
-@contextmanager
-def get_video_clip(video_path):
-    """上下文管理器，确保VideoFileClip正确关闭"""
-    clip = None
-    try:
-        clip = VideoFileClip(video_path)
-        yield clip
-    finally:
-        if clip is not None:
-            try:
-                clip.close()
-            except Exception as e:
-                print(f"⚠️ 关闭视频时发生错误: {e}")
+def generate_random_thumbnail(video_path, output_path, overwrite=True, quality=100, size=None, progress=None, stats=None):
+    """为视频生成随机封面图
 
+    output_path 可以是文件路径，也可以是可写的文件对象（例如 io.BytesIO）。
+    progress 为可选的进度回调 progress(percent, message)，供后台任务上报进度。
+    stats 为可选的字典，用于收集各阶段耗时（timings）、候选帧数、人脸命中数和失败原因（failure），
+    由调用方汇总到监控指标。
+    成功时结果中的 scores 为每个候选帧的画面质量评分，见 frame_quality.score_frames。
+    """
+    # 解码与检测依赖较重，延迟到第一次生成（或后台预热）时才导入，保证服务启动迅速
+    from PIL import Image
+    from face_detector import detect
+    from frame_extractor import extract_frames
+    from frame_quality import best_frame
 
-def has_face(frame):
-    """检测帧中是否包含人脸，使用多维度验证减少误判"""
-    gray = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2GRAY)
+    if stats is None:
+        stats = {}
+    timings = stats.setdefault("timings", {})
 
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+    def report(percent, message):
+        if progress:
+            progress(percent, message)
 
-    frame_height, frame_width = gray.shape[:2]
-    min_size = (max(40, frame_width // 10), max(40, frame_height // 10))
-    max_size = (frame_width // 2, frame_height // 2)
+    def fail(reason, message):
+        stats["failure"] = reason
+        return False, message
 
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.3,
-        minNeighbors=12,
-        minSize=min_size,
-        maxSize=max_size
-    )
+    # 不校验视频文件是否有效，直接尝试处理
+    try:
+        # 检查文件是否存在
+        if not os.path.exists(video_path):
+            return fail("not_found", f"视频文件不存在: {video_path}")
 
-    if len(faces) == 0:
-        return False
+        def pick_times(duration):
+            if duration < 0.1:
+                raise ValueError("视频过短")
+            report(20, "提取候选帧")
+            return [random.uniform(duration * 0.1, duration * 0.9) for _ in range(CANDIDATE_COUNT)]
 
-    valid_faces = []
+        report(5, "打开视频")
+        # 由提取器选择当前文件类型最快的解码后端，一次有序解码取出全部候选帧
+        try:
+            extracted = extract_frames(video_path, pick_times, size=size)
+        except ValueError as e:
+            return fail("too_short", str(e))
+        except Exception as e:
+            return fail("decode", f"获取视频帧失败: {str(e)}")
+        times, frames = extracted.timestamps, extracted.frames
+        timings["open"] = extracted.open_seconds
+        timings["decode"] = extracted.read_seconds
+        stats["backend"] = extracted.backend
+        stats["candidates"] = len(frames)
 
-    for (x, y, w, h) in faces:
-        aspect_ratio = w / h
-        face_center_x = x + w // 2
-        face_center_y = y + h // 2
-        is_centered = (
-            0.2 * frame_width < face_center_x < 0.8 * frame_width and
-            0.1 * frame_height < face_center_y < 0.8 * frame_height
-        )
+        report(60, "检测人脸")
+        start = time.perf_counter()
+        faces = detect(frames)
+        timings["face_detect"] = time.perf_counter() - start
+        stats["face_hits"] = sum(1 for boxes in faces if boxes)
 
-        face_ratio = (w * h) / (frame_width * frame_height)
+        # 一次计算所有候选帧的质量指标，排除黑场、白场和过场后优先选有人脸、得分最高的帧
+        start = time.perf_counter()
+        index, scores = best_frame(frames, [bool(boxes) for boxes in faces])
+        timings["score"] = time.perf_counter() - start
+        for entry, candidate_time in zip(scores, times):
+            entry["timestamp"] = candidate_time
+        found_face = bool(faces[index])
+        frame = frames[index]
+        t = times[index]
 
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
-        has_eyes = len(eyes) >= 1
+        start = time.perf_counter()
+        # 指定 size 时帧已在解码端缩放
+        img = Image.fromarray(frame)
 
-        is_valid = (0.7 < aspect_ratio < 1.3) and is_centered and has_eyes
-        if is_valid:
-            valid_faces.append((x, y, w, h))
+        report(80, "保存封面")
+        if isinstance(output_path, str):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        img.save(output_path, "JPEG", quality=quality)
+        timings["encode"] = time.perf_counter() - start
 
-    return len(valid_faces) > 0
+        result = {
+            "success": True,
+            "message": "封面生成成功",
+            "has_face": found_face,
+            "timestamp": t,
+            "backend": extracted.backend,
+            "scores": scores
+        }
+        return True, result
 
+    except Exception as e:
+        return fail("error", f"处理视频失败: {str(e)}")
 
-def generate_random_thumbnail(video_path, output_path, overwrite=True, quality=100, size=None):
-    """为视频生成随机封面图"""
-    # 不校验视频文件是否有效，直接尝试处理
-    try:
-        # 检查文件是否存在
-        if not os.path.exists(video_path):
-            return False, f"视频文件不存在: {video_path}"
-        
-        with get_video_clip(video_path) as clip:
-            duration = clip.duration
-            if duration < 0.1:
-                return False, "视频过短"
 
-            frame = None
-            found_face = False
-            face_time = None
+# 后台预热状态，/readyz 据此判断服务是否就绪
+_warmup_done = threading.Event()
+_warmup_state = {"ffmpeg": None, "error": None}
 
-            for _ in range(5):
-                t = random.uniform(duration * 0.1, duration * 0.9)
-                try:
-                    temp_frame = clip.get_frame(t)
-                    if has_face(temp_frame):
-                        frame = temp_frame
-                        found_face = True
-                        face_time = t
-                        break
-                except Exception as e:
-                    continue
 
-            if frame is None:
-                t = random.uniform(duration * 0.1, duration * 0.9)
-                try:
-                    frame = clip.get_frame(t)
-                except Exception as e:
-                    return False, f"获取视频帧失败: {str(e)}"
+def warm_up():
+    """导入解码与人脸检测依赖并检查ffmpeg，完成后服务进入就绪状态
 
-            img = Image.fromarray(frame)
+    Haar分类器按线程保存，在这里加载只对预热线程本身有效；
+    各工作线程/进程启动时由 warm_up_worker 各自加载。
+    """
+    start = time.perf_counter()
+    try:
+        import numpy
+        import cv2
+        from PIL import Image
+        import face_detector
+        import frame_extractor
+        _warmup_state["ffmpeg"] = check_ffmpeg()
+        if not _warmup_state["ffmpeg"]:
+            print("❌ 警告: 未找到ffmpeg，这是视频处理的必要依赖。")
+        print(f"🔥 预热完成，耗时 {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        _warmup_state["error"] = str(e)
+        print(f"❌ 预热失败: {e}")
+    finally:
+        _warmup_done.set()
 
-            if size:
-                try:
-                    img = img.resize(size, Image.LANCZOS)
-                except Exception as e:
-                    return False, f"调整图片尺寸失败: {str(e)}"
 
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path, "JPEG", quality=quality)
+def warm_up_worker():
+    """任务线程和批量进程的初始化函数：为当前线程加载人脸分类器，首个任务无需再解析XML"""
+    try:
+        import face_detector
+        face_detector.warm_up()
+    except Exception as e:
+        print(f"⚠️ 工作线程加载人脸分类器失败: {e}")
 
-            result = {
-                "success": True,
-                "message": "封面生成成功",
-                "has_face": found_face,
-                "timestamp": face_time if found_face else t
-            }
-            return True, result
 
-    except Exception as e:
-        return False, f"处理视频失败: {str(e)}"
+def start_warm_up():
+    """在后台线程中预热，不阻塞Web服务开始监听"""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
 # Web界面模板
@@ -241,23 +281,34 @@ HTML_TEMPLATE = '''
             border-radius: 4px;
             margin-top: 10px;
         }
-        .loading {
-            display: none;
-            text-align: center;
-            padding: 20px;
+        .job-list {
+            margin-top: 20px;
         }
-        .spinner {
-            border: 4px solid #f3f3f3;
-            border-top: 4px solid #3498db;
-            border-radius: 50%;
-            width: 40px;
-            height: 40px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto;
+        .job-item {
+            padding: 8px 12px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            margin: 6px 0;
+            cursor: pointer;
         }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
+        .job-item.done {
+            background-color: #d4edda;
+        }
+        .job-item.failed {
+            background-color: #f8d7da;
+        }
+        .job-progress {
+            height: 6px;
+            background-color: #ecf0f1;
+            border-radius: 3px;
+            margin-top: 4px;
+        }
+        .job-progress-bar {
+            height: 100%;
+            width: 0;
+            background-color: #3498db;
+            border-radius: 3px;
+            transition: width 0.3s;
         }
         .controls {
             margin-top: 20px;
@@ -303,20 +354,11 @@ HTML_TEMPLATE = '''
         <div class="file-browser">
             <div class="current-path">当前路径: {{ current_path }}</div>
             
-            <div class="dir-list">
-                {% if current_path != ROOT_DIR %}
-                <div class="item dir back-btn" onclick="navigateTo('..')">📁 .. (上级目录)</div>
-                {% endif %}
-                {% for dir in dirs %}
-                <div class="item dir" onclick="navigateTo('{{ dir }}')">📁 {{ dir }}</div>
-                {% endfor %}
-            </div>
+            <div class="dir-list" id="dir-list"></div>
             
-            <div class="file-list">
-                {% for file in files %}
-                <div class="item file" onclick="selectFile('{{ file }}')">🎥 {{ file }}</div>
-                {% endfor %}
-            </div>
+            <div class="file-list" id="file-list"></div>
+            
+            <button id="load-more-btn" onclick="loadEntries()" style="display: none;">加载更多</button>
         </div>
         
         <div class="controls">
@@ -326,13 +368,15 @@ HTML_TEMPLATE = '''
                 <span id="quality-value">100</span>
             </div>
             
+            <div class="quality-control">
+                <label><input type="checkbox" id="force"> 重新生成（忽略缓存）</label>
+            </div>
+            
             <button id="generate-btn" onclick="generateThumbnail()" disabled>生成封面</button>
+            <button id="batch-btn" onclick="generateBatch()">批量生成当前目录</button>
         </div>
         
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            <p>正在生成封面，请稍候...</p>
-        </div>
+        <div class="job-list" id="job-list"></div>
         
         <div id="message" class="message" style="display: none;"></div>
         
@@ -347,7 +391,7 @@ HTML_TEMPLATE = '''
         const qualitySlider = document.getElementById('quality');
         const qualityValue = document.getElementById('quality-value');
         const generateBtn = document.getElementById('generate-btn');
-        const loading = document.getElementById('loading');
+        const jobList = document.getElementById('job-list');
         const message = document.getElementById('message');
         const previewImg = document.getElementById('preview-img');
         
@@ -355,11 +399,61 @@ HTML_TEMPLATE = '''
             qualityValue.textContent = this.value;
         });
         
+        const currentPath = {{ rel_path|tojson }};
+        const dirList = document.getElementById('dir-list');
+        const fileList = document.getElementById('file-list');
+        const loadMoreBtn = document.getElementById('load-more-btn');
+        const PAGE_SIZE = 200;
+        let nextOffset = 0;
+        
         function navigateTo(path) {
             window.location.href = `/?path=${encodeURIComponent(path)}`;
         }
         
-        function selectFile(file) {
+        function parentPath(path) {
+            const parts = path.split('/').filter(p => p);
+            parts.pop();
+            return parts.join('/');
+        }
+        
+        function addItem(container, className, text, onclick) {
+            const el = document.createElement('div');
+            el.className = `item ${className}`;
+            el.textContent = text;
+            el.title = text;
+            el.addEventListener('click', () => onclick(el));
+            container.appendChild(el);
+        }
+        
+        function loadEntries() {
+            // 分页从目录索引API获取列表，大目录无需一次渲染全部条目
+            loadMoreBtn.disabled = true;
+            fetch(`/api/list?path=${encodeURIComponent(currentPath)}&offset=${nextOffset}&limit=${PAGE_SIZE}`)
+            .then(response => response.json())
+            .then(data => {
+                loadMoreBtn.disabled = false;
+                if (data.error) {
+                    showMessage(`❌ ${data.error}`, false);
+                    return;
+                }
+                data.items.forEach(item => {
+                    const itemPath = currentPath ? `${currentPath}/${item.name}` : item.name;
+                    if (item.type === 'dir') {
+                        addItem(dirList, 'dir', `📁 ${item.name}`, () => navigateTo(itemPath));
+                    } else {
+                        addItem(fileList, 'file', `🎥 ${item.name}`, el => selectFile(item.name, el));
+                    }
+                });
+                nextOffset = data.offset + data.items.length;
+                loadMoreBtn.style.display = nextOffset < data.total ? 'inline-block' : 'none';
+            })
+            .catch(error => {
+                loadMoreBtn.disabled = false;
+                showMessage(`❌ 加载目录失败: ${error}`, false);
+            });
+        }
+        
+        function selectFile(file, selectedEl) {
             // 移除其他文件的选中状态
             document.querySelectorAll('.file-list .file').forEach(el => {
                 el.style.border = '1px solid #ddd';
@@ -368,7 +462,6 @@ HTML_TEMPLATE = '''
             
             // 设置当前选中文件
             selectedFile = file;
-            const selectedEl = event.target;
             selectedEl.style.border = '2px solid #3498db';
             selectedEl.style.backgroundColor = '#d6eaf8';
             
@@ -382,16 +475,149 @@ HTML_TEMPLATE = '''
             message.style.display = 'block';
         }
         
+        function showResult(data) {
+            let text = `✅ 封面生成成功！${data.has_face ? '检测到人脸' : '按画面评分选帧'} 时间点: ${data.timestamp.toFixed(2)}s`;
+            if (data.cached) {
+                text += ' ⚡ 来自缓存';
+            }
+            if (data.saved_path) {
+                text += ` 📁 已保存到视频同级目录`;
+            }
+            if (data.warning) {
+                text += ` ⚠️ ${data.warning}`;
+            }
+            showMessage(text);
+        }
+        
+        function showPreview(jobId) {
+            previewImg.src = `/preview/${jobId}`;
+            previewImg.style.display = 'block';
+        }
+        
+        function renderJob(el, name, job) {
+            el.className = `job-item ${job.status}`;
+            el.querySelector('.job-text').textContent = `🎥 ${name} - ${job.message} (${job.progress}%)`;
+            el.querySelector('.job-progress-bar').style.width = `${job.progress}%`;
+        }
+        
+        function watchJob(jobId, name) {
+            // 每个任务在列表中占一行，任务之间互不阻塞
+            const el = document.createElement('div');
+            el.className = 'job-item';
+            el.innerHTML = '<div class="job-text"></div><div class="job-progress"><div class="job-progress-bar"></div></div>';
+            jobList.prepend(el);
+            renderJob(el, name, {status: 'queued', message: '排队中', progress: 0});
+            
+            const source = new EventSource(`/jobs/${jobId}/events`);
+            source.onmessage = function(event) {
+                const job = JSON.parse(event.data);
+                renderJob(el, name, job);
+                if (job.status === 'done') {
+                    source.close();
+                    el.onclick = () => { showResult(job.result); showPreview(jobId); };
+                    showResult(job.result);
+                    showPreview(jobId);
+                } else if (job.status === 'failed') {
+                    source.close();
+                    el.onclick = () => showMessage(`❌ ${name}: ${job.error}`, false);
+                    showMessage(`❌ ${name}: ${job.error}`, false);
+                }
+            };
+            source.onerror = function() {
+                // SSE断开时退回轮询任务状态
+                source.close();
+                pollJob(jobId, name, el);
+            };
+        }
+        
+        function pollJob(jobId, name, el) {
+            fetch(`/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                renderJob(el, name, job);
+                if (job.status === 'done') {
+                    showResult(job.result);
+                    showPreview(jobId);
+                } else if (job.status === 'failed') {
+                    showMessage(`❌ ${name}: ${job.error}`, false);
+                } else {
+                    setTimeout(() => pollJob(jobId, name, el), 1000);
+                }
+            })
+            .catch(error => showMessage(`❌ 查询任务失败: ${error}`, false));
+        }
+        
+        function generateBatch() {
+            // 读取NDJSON流，每处理完一个视频刷新一次进度
+            const batchBtn = document.getElementById('batch-btn');
+            batchBtn.disabled = true;
+            message.style.display = 'none';
+            
+            const el = document.createElement('div');
+            el.className = 'job-item';
+            el.innerHTML = '<div class="job-text"></div>';
+            jobList.prepend(el);
+            const text = el.querySelector('.job-text');
+            const counts = {generated: 0, skipped: 0, failed: 0};
+            const label = `📂 ${currentPath || '/'}`;
+            text.textContent = `${label} - 扫描中`;
+            
+            function handleRecord(record) {
+                if (record.status === 'summary') {
+                    el.className = `job-item ${record.failed ? 'failed' : 'done'}`;
+                    text.textContent = `${label} - 完成: 生成 ${record.generated}, 跳过 ${record.skipped}, 失败 ${record.failed}`;
+                    return;
+                }
+                counts[record.status] += 1;
+                text.textContent = `${label} - 生成 ${counts.generated}, 跳过 ${counts.skipped}, 失败 ${counts.failed} (最近: ${record.path})`;
+            }
+            
+            fetch('/generate_batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    path: currentPath,
+                    quality: parseInt(qualitySlider.value),
+                    force: document.getElementById('force').checked,
+                    skip_existing: !document.getElementById('force').checked
+                })
+            })
+            .then(async response => {
+                if (!response.ok) {
+                    const data = await response.json();
+                    throw new Error(data.error);
+                }
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const {value, done} = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, {stream: true});
+                    const lines = buffer.split('\\n');
+                    buffer = lines.pop();
+                    lines.filter(line => line.trim()).forEach(line => handleRecord(JSON.parse(line)));
+                }
+            })
+            .catch(error => {
+                el.className = 'job-item failed';
+                showMessage(`❌ 批量生成失败: ${error.message || error}`, false);
+            })
+            .finally(() => {
+                batchBtn.disabled = false;
+            });
+        }
+        
         function generateThumbnail() {
             if (!selectedFile) return;
             
-            loading.style.display = 'block';
             message.style.display = 'none';
-            previewImg.style.display = 'none';
             
             const quality = qualitySlider.value;
-            const currentPath = new URLSearchParams(window.location.search).get('path') || '';
             const filePath = currentPath ? `${currentPath}/${selectedFile}` : selectedFile;
+            const name = selectedFile;
             
             fetch('/generate', {
                 method: 'POST',
@@ -400,136 +626,461 @@ HTML_TEMPLATE = '''
                 },
                 body: JSON.stringify({
                     file_path: filePath,
-                    quality: parseInt(quality)
+                    quality: parseInt(quality),
+                    force: document.getElementById('force').checked
                 })
             })
             .then(response => response.json())
             .then(data => {
-                loading.style.display = 'none';
-                
                 if (data.success) {
-                    let message = `✅ 封面生成成功！${data.has_face ? '检测到人脸' : '使用随机帧'} 时间点: ${data.timestamp.toFixed(2)}s`;
-                    if (data.saved_path) {
-                        message += `<br>📁 已保存到视频同级目录`;
-                    }
-                    if (data.warning) {
-                        message += `<br>⚠️ ${data.warning}`;
-                    }
-                    showMessage(message);
-                    previewImg.src = `/preview?t=${Date.now()}`;
-                    previewImg.style.display = 'block';
+                    watchJob(data.job_id, name);
                 } else {
                     showMessage(`❌ ${data.error}`, false);
                 }
             })
             .catch(error => {
-                loading.style.display = 'none';
                 showMessage(`❌ 请求失败: ${error}`, false);
             });
         }
+        
+        if (currentPath) {
+            addItem(dirList, 'dir back-btn', '📁 .. (上级目录)', () => navigateTo(parentPath(currentPath)));
+        }
+        loadEntries();
     </script>
 </body>
 </html>
 '''
 
 
+def resolve_path(rel_path):
+    """把相对ROOT_DIR的路径转换为完整路径，超出ROOT_DIR范围时返回None"""
+    root = os.path.normpath(ROOT_DIR)
+    full_path = os.path.normpath(os.path.join(root, rel_path or ''))
+    if full_path != root and not full_path.startswith(root + os.sep):
+        return None
+    return full_path
+
+
 @app.route('/')
 def index():
-    """首页 - 文件浏览器"""
-    # 不进行路径校验，默认使用当前目录
+    """首页 - 文件浏览器，目录内容由前端通过 /api/list 分页加载"""
     path = request.args.get('path', '')
-    full_path = os.path.join(ROOT_DIR, path).replace('\\', '/')
-    
-    # 确保路径在ROOT_DIR范围内，但不检查是否存在
-    if not full_path.startswith(ROOT_DIR):
-        full_path = ROOT_DIR
-        path = ''
+    full_path = resolve_path(path)
     
-    dirs = []
-    files = []
-    
-    # 尝试列出目录内容，不处理异常
-    try:
-        if os.path.exists(full_path) and os.path.isdir(full_path):
-            for item in os.listdir(full_path):
-                item_path = os.path.join(full_path, item)
-                if os.path.isdir(item_path):
-                    dirs.append(item)
-                elif os.path.isfile(item_path) and any(item.lower().endswith(ext) for ext in SUPPORTED_EXTS):
-                    files.append(item)
-    except:
-        pass  # 忽略错误，显示空列表
+    # 路径超出ROOT_DIR范围时回到根目录
+    if full_path is None:
+        full_path = os.path.normpath(ROOT_DIR)
+    rel_path = os.path.relpath(full_path, os.path.normpath(ROOT_DIR)).replace('\\', '/')
+    if rel_path == '.':
+        rel_path = ''
     
     return render_template_string(
         HTML_TEMPLATE,
         current_path=full_path,
-        ROOT_DIR=ROOT_DIR,
-        dirs=dirs,
-        files=files
+        rel_path=rel_path
     )
 
 
+@app.route('/api/list')
+def api_list():
+    """分页列出目录中的子目录和视频文件"""
+    full_path = resolve_path(request.args.get('path', ''))
+    if full_path is None:
+        return jsonify({'error': '路径不允许'}), 403
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', 200))), 1000)
+    except ValueError:
+        return jsonify({'error': '分页参数无效'}), 400
+    
+    try:
+        page = dir_index.page(full_path, offset=offset, limit=limit)
+    except OSError as e:
+        return jsonify({'error': f'无法读取目录: {e.strerror or e}'}), 404
+    return jsonify(page)
+
+
+# 生成流程的监控指标，通过 /metrics 以Prometheus文本格式暴露
+STAGE_SECONDS = Histogram(
+    "thumbnail_stage_seconds", "封面生成各阶段耗时（open=打开视频, decode=seek与解码, face_detect, score=画面评分, encode=JPEG编码, "
+    "cache_lookup, sidecar_write）", labelnames=("stage",)
+)
+GENERATE_SECONDS = Histogram("thumbnail_generate_seconds", "单次封面生成的总耗时", labelnames=("source",))
+GENERATIONS = Counter("thumbnail_generations", "封面生成次数", labelnames=("source", "result"))
+FAILURES = Counter("thumbnail_failures", "封面生成失败次数", labelnames=("reason",))
+CANDIDATES = Counter("thumbnail_candidates", "检查过的候选帧数")
+FACE_HITS = Counter("thumbnail_face_hits", "检测到人脸的候选帧数")
+BACKEND_USES = Counter("thumbnail_backend_uses", "各解码后端的使用次数", labelnames=("backend",))
+BYTES_WRITTEN = Counter("thumbnail_bytes_written", "写入同级目录的封面字节数")
+
+
+def observe_generation(stats, source, success):
+    """把一次生成收集到的stats汇总到监控指标"""
+    for stage, seconds in stats.get("timings", {}).items():
+        if seconds is not None:
+            STAGE_SECONDS.observe(seconds, stage=stage)
+    if "total" in stats:
+        GENERATE_SECONDS.observe(stats["total"], source=source)
+    GENERATIONS.inc(source=source, result="success" if success else "failure")
+    if not success:
+        FAILURES.inc(reason=stats.get("failure", "error"))
+    CANDIDATES.inc(stats.get("candidates", 0))
+    FACE_HITS.inc(stats.get("face_hits", 0))
+    if stats.get("backend"):
+        BACKEND_USES.inc(backend=stats["backend"])
+    BYTES_WRITTEN.inc(stats.get("bytes_written", 0))
+
+
+# 文件浏览器使用的目录索引缓存
+dir_index = DirectoryIndex(SUPPORTED_EXTS)
+
+# 最近生成的封面预览，按任务ID保存在内存中
+preview_store = PreviewStore(max_bytes=PREVIEW_CACHE_BYTES)
+
+job_queue = JobQueue(max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, initializer=warm_up_worker)
+
+# 持久化的生成结果缓存，重复请求未变化的视频时直接返回
+result_cache = ResultCache(RESULT_CACHE_DB, os.path.join(TEMP_DIR, "results"), max_bytes=RESULT_CACHE_BYTES)
+
+
+def _lookup_cached_result(full_path, quality, stats):
+    """查询结果缓存，命中时返回 (图片数据, 结果字典)，否则返回None"""
+    start = time.perf_counter()
+    try:
+        cached = result_cache.get(full_path, quality=quality)
+    except Exception as e:
+        print(f"⚠️ 读取结果缓存失败: {e}")
+        return None
+    finally:
+        stats.setdefault("timings", {})["cache_lookup"] = time.perf_counter() - start
+    if cached is None:
+        return None
+    result = {
+        "success": True,
+        "message": "封面生成成功（缓存）",
+        "has_face": cached["has_face"],
+        "timestamp": cached["timestamp"],
+        "cached": True
+    }
+    return cached["data"], result
+
+
+def produce_poster(full_path, quality, force=False, progress=None, stats=None):
+    """生成（或从缓存取出）封面图，返回 (JPEG数据, 结果字典)，失败时抛出异常
+
+    源视频未变化且参数相同时直接使用结果缓存，force为True时忽略缓存重新生成。
+    """
+    if stats is None:
+        stats = {}
+    cached = None if force else _lookup_cached_result(full_path, quality, stats)
+    if cached is not None:
+        stats["cached"] = True
+        return cached
+
+    # 生成封面图到内存，供预览和写入同级目录共用
+    buffer = io.BytesIO()
+    success, result = generate_random_thumbnail(full_path, buffer, quality=quality, progress=progress, stats=stats)
+    if not success:
+        raise RuntimeError(result)
+    data = buffer.getvalue()
+    try:
+        result_cache.put(full_path, data, result["timestamp"], result["has_face"], quality=quality)
+    except Exception as e:
+        print(f"⚠️ 写入结果缓存失败: {e}")
+    return data, result
+
+
+def save_sidecar_poster(full_path, data, result, stats=None):
+    """把封面数据直接写入视频同级目录的poster.jpg，结果写入result"""
+    if stats is None:
+        stats = {}
+    # 生成同级目录输出路径 - 默认使用'poster.jpg'作为文件名
+    video_dir = os.path.dirname(full_path)
+    sidecar_output_path = os.path.join(video_dir, "poster.jpg")
+    start = time.perf_counter()
+    try:
+        with open(sidecar_output_path, 'wb') as f:
+            f.write(data)
+        stats.setdefault("timings", {})["sidecar_write"] = time.perf_counter() - start
+        stats["bytes_written"] = len(data)
+        print(f"✅ 封面已保存到: {sidecar_output_path}")
+        result['saved_path'] = sidecar_output_path
+    except Exception as e:
+        stats["failure"] = "sidecar_write"
+        print(f"⚠️ 保存到同级目录失败: {e}")
+        # 仍然返回成功，但添加警告信息
+        result['warning'] = f"封面生成成功但无法保存到同级目录: {str(e)}"
+
+
+def run_generate_job(full_path, job_id, quality, force=False, progress=None):
+    """后台任务：生成封面图并写入视频同级目录，失败时抛出异常"""
+    stats = {}
+    start = time.perf_counter()
+    try:
+        data, result = produce_poster(full_path, quality, force=force, progress=progress, stats=stats)
+    except Exception:
+        stats["total"] = time.perf_counter() - start
+        observe_generation(stats, "job", success=False)
+        raise
+    preview_store.put(job_id, data)
+
+    # 直接从内存写入视频同级目录
+    if progress:
+        progress(90, "保存到同级目录")
+    save_sidecar_poster(full_path, data, result, stats)
+    stats["total"] = time.perf_counter() - start
+    observe_generation(stats, "job", success="warning" not in result)
+    return result
+
+
+def iter_videos(dir_path, max_depth):
+    """通过目录索引按深度优先列出目录树下的视频文件"""
+    dirs, files = dir_index.list(dir_path)
+    for name in files:
+        yield os.path.join(dir_path, name)
+    if max_depth > 0:
+        for name in dirs:
+            try:
+                yield from iter_videos(os.path.join(dir_path, name), max_depth - 1)
+            except OSError:
+                continue  # 忽略无法访问的目录
+
+
+def batch_generate_poster(full_path, quality, skip_existing, force):
+    """批量任务的工作进程函数，处理单个视频并返回结果记录
+
+    工作进程中的指标无法直接汇总，因此把stats放进结果记录，由Web进程记录后移除。
+    返回给浏览器的字段只有 path、status、output（写入的poster路径）和 error。
+    """
+    record = {'path': full_path}
+    if skip_existing and os.path.exists(os.path.join(os.path.dirname(full_path), "poster.jpg")):
+        record['status'] = 'skipped'
+        return record
+    stats = record['stats'] = {}
+    start = time.perf_counter()
+    try:
+        data, result = produce_poster(full_path, quality, force=force, stats=stats)
+    except Exception as e:
+        stats["total"] = time.perf_counter() - start
+        record.update(status='failed', error=str(e))
+        return record
+    save_sidecar_poster(full_path, data, result, stats)
+    stats["total"] = time.perf_counter() - start
+    record.update(status='failed' if 'warning' in result else 'generated', output=result.get('saved_path'))
+    if 'warning' in result:
+        record['error'] = result['warning']
+    return record
+
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def get_batch_pool():
+    """惰性创建批量生成共用的进程池
+
+    使用spawn方式启动子进程，避免在多线程的Web进程中fork导致锁状态被复制。
+    """
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up_worker
+            )
+        return _batch_pool
+
+
+def reset_batch_pool(pool):
+    """丢弃已损坏的进程池（有工作进程因OOM、崩溃等异常退出），下次 get_batch_pool 时重建"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _job_response(job):
+    """转换为返回给浏览器的任务状态"""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'result': job['result'],
+        'error': job['error'],
+    }
+
+
 @app.route('/generate', methods=['POST'])
 def generate():
-    """生成封面图API"""
+    """生成封面图API - 提交后台任务并立即返回任务ID"""
     data = request.json
     file_path = data.get('file_path')
     quality = data.get('quality', 100)
+    force = bool(data.get('force', False))
     
     if not file_path:
         return jsonify({'success': False, 'error': '未指定文件路径'})
     
-    # 构建完整路径，不校验路径有效性
-    full_path = os.path.join(ROOT_DIR, file_path).replace('\\', '/')
+    # 规范化后确认仍在ROOT_DIR范围内
+    full_path = resolve_path(file_path)
+    if full_path is None:
+        return jsonify({'success': False, 'error': '路径不允许'}), 403
     
-    # 只做基本的安全检查，确保在ROOT_DIR范围内
-    if not full_path.startswith(ROOT_DIR):
-        return jsonify({'success': False, 'error': '路径不允许'})
-    
-    # 生成临时输出路径
-    temp_output = os.path.join(TEMP_DIR, 'temp_thumbnail.jpg')
-    
-    # 生成同级目录输出路径 - 默认使用'poster.jpg'作为文件名
-    video_dir = os.path.dirname(full_path)
-    sidecar_output_path = os.path.join(video_dir, "poster.jpg")
-    
-    # 生成封面图（先生成到临时文件）
-    success, result = generate_random_thumbnail(full_path, temp_output, quality=quality)
-    
-    # 如果成功，复制到视频同级目录
-    if success:
+    job_id = new_job_id()
+    try:
+        job_queue.submit(run_generate_job, full_path, job_id, quality, force=force, job_id=job_id)
+    except QueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """查询任务状态"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(_job_response(job))
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """以Server-Sent Events推送任务进度，任务结束后关闭连接"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    def stream():
+        for job in job_queue.events(job_id):
+            if job is None:
+                # 心跳注释，防止代理断开空闲连接
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(_job_response(job), ensure_ascii=False)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    """批量生成目录树下所有视频的封面，以NDJSON逐行返回每个视频的处理结果"""
+    data = request.json or {}
+    full_path = resolve_path(data.get('path', ''))
+    if full_path is None:
+        return jsonify({'success': False, 'error': '路径不允许'}), 403
+    if not os.path.isdir(full_path):
+        return jsonify({'success': False, 'error': '目录不存在'}), 404
+    quality = data.get('quality', 100)
+    skip_existing = bool(data.get('skip_existing', True))
+    force = bool(data.get('force', False))
+    try:
+        max_depth = max(0, int(data.get('depth', 2)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': '目录深度无效'}), 400
+
+    def stream():
+        pool = get_batch_pool()
+
+        def submit(video_path):
+            nonlocal pool
+            try:
+                return pool.submit(batch_generate_poster, video_path, quality, skip_existing, force)
+            except BrokenProcessPool:
+                # 进程池已损坏时换一个新的，已提交的任务由 emit 记为失败
+                reset_batch_pool(pool)
+                pool = get_batch_pool()
+                return pool.submit(batch_generate_poster, video_path, quality, skip_existing, force)
+
+        # 限制同时提交的任务数，目录很大时也不会一次占满内存
+        max_in_flight = BATCH_WORKERS * 4
+        pending = {}
+        counts = {'generated': 0, 'skipped': 0, 'failed': 0}
+
+        def emit(done):
+            for future in done:
+                video_path, owner = pending.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool as e:
+                    reset_batch_pool(owner)
+                    record = {'status': 'failed', 'error': f'工作进程异常退出: {e}'}
+                except Exception as e:
+                    record = {'status': 'failed', 'error': str(e)}
+                record['path'] = os.path.relpath(video_path, ROOT_DIR).replace('\\', '/')
+                if record.get('output'):
+                    record['output'] = os.path.relpath(record['output'], ROOT_DIR).replace('\\', '/')
+                stats = record.pop('stats', None)
+                if stats is not None:
+                    observe_generation(stats, "batch", success=record['status'] == 'generated')
+                counts[record['status']] += 1
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
         try:
-            # 复制文件到视频同级目录
-            shutil.copy2(temp_output, sidecar_output_path)
-            print(f"✅ 封面已保存到: {sidecar_output_path}")
-            result['saved_path'] = sidecar_output_path
-        except Exception as e:
-            print(f"⚠️ 保存到同级目录失败: {e}")
-            # 仍然返回成功，但添加警告信息
-            result['warning'] = f"封面生成成功但无法保存到同级目录: {str(e)}"
-    
-    if success:
-        return jsonify({'success': True, **result})
-    else:
-        return jsonify({'success': False, 'error': result})
+            for video_path in iter_videos(full_path, max_depth):
+                try:
+                    future = submit(video_path)
+                except BrokenProcessPool as e:
+                    counts['failed'] += 1
+                    record = {'path': os.path.relpath(video_path, ROOT_DIR).replace('\\', '/'),
+                              'status': 'failed', 'error': f'工作进程异常退出: {e}'}
+                    yield json.dumps(record, ensure_ascii=False) + "\n"
+                    continue
+                pending[future] = (video_path, pool)
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from emit(done)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from emit(done)
+            yield json.dumps({'status': 'summary', 'total': sum(counts.values()), **counts}, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消尚未开始的任务
+            for future in list(pending):
+                future.cancel()
 
+    return Response(stream(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
 
-@app.route('/preview')
-def preview():
-    """预览生成的封面图"""
-    temp_output = os.path.join(TEMP_DIR, 'temp_thumbnail.jpg')
-    
-    if os.path.exists(temp_output):
-        return send_file(temp_output, mimetype='image/jpeg')
+
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能响应请求即可"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """就绪检查：后台预热完成且依赖加载成功后才返回200"""
+    if not _warmup_done.is_set():
+        return jsonify({'ready': False, 'status': 'warming_up'}), 503
+    if _warmup_state['error']:
+        return jsonify({'ready': False, 'status': 'error', 'error': _warmup_state['error']}), 503
+    return jsonify({'ready': True, 'status': 'ready', 'ffmpeg': _warmup_state['ffmpeg']})
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus文本格式的监控指标"""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/preview/<job_id>')
+def preview(job_id):
+    """预览指定任务生成的封面图"""
+    data = preview_store.get(job_id)
+    if data is not None:
+        return send_file(io.BytesIO(data), mimetype='image/jpeg')
     else:
         return jsonify({'error': '预览图不存在'}), 404
 
 
 def main():
     """启动Web服务"""
-    # 检查ffmpeg
-    if not check_ffmpeg():
-        print("❌ 警告: 未找到ffmpeg，这是视频处理的必要依赖。")
+    # 依赖加载和ffmpeg检查放到后台，服务立即开始监听
+    start_warm_up()
     
     # 确保必要的目录存在
     os.makedirs(ROOT_DIR, exist_ok=True)
@@ -1,13 +1,21 @@
 import os
 import random
+import argparse
 import subprocess
 import sys
-import importlib.util
-from PIL import Image
-import numpy as np
-import tempfile
 import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import Tk, filedialog
+from frame_extractor import extract_frames
+from renditions import Rendition, render_all, write_output
+from crop_planner import find_subjects
+from image_hash import HashIndex
+from batch_journal import BatchJournal, DONE, FAILED, default_path as default_journal_path
+from video_walker import collect_videos
+from pipeline import Stage, run_pipeline, parse_stage_workers
+import media_probe
+from concurrency import AdaptiveController
 
 # 尝试导入cv2，如果失败提供更详细的错误信息
 try:
@@ -30,6 +38,9 @@ except ImportError:
 # 支持的视频格式
 SUPPORTED_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm"]
 
+# 未指定输出尺寸时限制的最大宽度
+MAX_WIDTH = 1920
+
 def check_ffmpeg():
     """检查系统是否安装了ffmpeg"""
     try:
@@ -38,130 +49,81 @@ def check_ffmpeg():
     except (subprocess.SubprocessError, FileNotFoundError):
         return False
 
-def _ffprobe_duration(video_path):
+# 2:3竖向poster的宽高比
+POSTER_RATIO = 2 / 3
+
+def pick_random_time(duration):
+    """在视频中间80%的范围内随机选一个时间点"""
+    if duration > 0.2:
+        return [random.uniform(duration * 0.1, duration * 0.9)]
+    return [0]
+
+def decode_size(video_path, renditions):
+    """所有规格都只限制最大宽度时，返回解码端等比缩放到的 (宽, 高)；无需缩放或无法取得源尺寸时返回None
+
+    最大宽度是等比缩放，在解码端先缩放不改变之后的裁剪位置，也不必把4K/8K的完整帧读入内存。
+    """
+    if not renditions or any(r.size or not r.max_width for r in renditions):
+        return None
     try:
-        out = subprocess.run([
-            "ffprobe", "-v", "error", "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1", video_path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True)
-        return float(out.stdout.strip())
+        info = media_probe.probe(video_path)
     except Exception:
         return None
+    width, height = info.get("width"), info.get("height")
+    if not width or not height:
+        return None
+    if info.get("rotation") in (90, 270):
+        width, height = height, width
+    max_width = max(r.max_width for r in renditions)
+    if width <= max_width:
+        return None
+    # 高度取偶数以兼容yuv420缩放（与 scale=...:-2 一致）
+    return max_width, max(2, int(round(height * max_width / width / 2)) * 2)
 
-def generate_thumbnail(video_path, output_path, quality=100, size=None, vertical=False):
+def crop_subjects(frame, renditions):
+    """需要截取固定宽高比时，在缩小的代理图上查找人脸或显著区域作为裁剪依据"""
+    if not any(rendition.ratio for rendition in renditions):
+        return None
+    subjects, _ = find_subjects(frame)
+    return subjects
+
+def generate_renditions(video_path, renditions, keyframes_only=False):
+    """只解码一次随机帧，按多种规格输出图片
+    
+    keyframes_only 为 True 时随机时间点对齐到最近的关键帧，只解码关键帧（快速模式）。
+    返回 (成功与否, 结果)；成功时结果包含 frame_index、backend 以及
+    renditions: {名称: (成功与否, 结果字典或错误信息)}
+    """
     try:
         if not os.path.exists(video_path):
             return False, f"视频文件不存在: {video_path}"
 
-        if check_ffmpeg():
-            duration = _ffprobe_duration(video_path)
-            if duration and duration > 0.2:
-                t = random.uniform(duration * 0.1, duration * 0.9)
-            else:
-                t = 10
-            vf_parts = []
-            if size and len(size) == 2:
-                vf_parts.append(f"scale={size[0]}:{size[1]}")
-            else:
-                vf_parts.append("scale=min(1920\\,iw):-2")
-            vf = ",".join(vf_parts)
-            cmd = [
-                "ffmpeg", "-hide_banner", "-loglevel", "error", "-hwaccel", "auto",
-                "-ss", f"{t}", "-i", video_path,
-                "-frames:v", "1", "-vf", vf,
-                "-q:v", "2", "-y", output_path
-            ]
-            try:
-                subprocess.run(cmd, check=True)
-                # 如需竖截图或进一步尺寸调整，使用PIL进行后处理
-                try:
-                    post_img = Image.open(output_path)
-                    if vertical:
-                        w, h = post_img.size
-                        target_ratio = 2 / 3
-                        target_w = int(h * target_ratio)
-                        if target_w > w:
-                            target_w = w
-                            target_h = int(w / target_ratio)
-                            if target_h > h:
-                                target_h = h
-                            top = (h - target_h) // 2
-                            bottom = top + target_h
-                            left = 0
-                            right = w
-                        else:
-                            left = (w - target_w) // 2
-                            right = left + target_w
-                            top = 0
-                            bottom = h
-                        post_img = post_img.crop((left, top, right, bottom))
-                    elif size and len(size) == 2:
-                        post_img = post_img.resize(size, Image.LANCZOS)
-                    post_img.save(output_path, "JPEG", quality=quality)
-                except Exception:
-                    pass
-                frame_idx = None
-                try:
-                    cap_meta = cv2.VideoCapture(video_path)
-                    fps = cap_meta.get(cv2.CAP_PROP_FPS)
-                    frame_idx = int(t * fps) if fps and fps > 0 else None
-                    cap_meta.release()
-                except Exception:
-                    frame_idx = None
-                return True, {"success": True, "message": "封面生成成功", "frame_index": frame_idx}
-            except Exception:
-                pass
-
-        cap = cv2.VideoCapture(video_path)
-        if not hasattr(cv2, 'VideoCapture') or not cap.isOpened():
-            return False, "无法打开视频文件"
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if total_frames <= 0:
-            cap.release()
-            return False, "无法获取视频帧数"
-        start_frame = int(total_frames * 0.1)
-        end_frame = int(total_frames * 0.9)
-        if start_frame >= end_frame:
-            start_frame = 0
-            end_frame = total_frames - 1
-        target_frame = random.randint(start_frame, end_frame)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
-        ret, frame = cap.read()
-        cap.release()
-        if not ret:
-            return False, "无法读取视频帧"
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(rgb_frame)
-        if vertical:
-            width, height = img.size
-            target_ratio = 2 / 3
-            target_width = int(height * target_ratio)
-            if target_width > width:
-                target_width = width
-                target_height = int(width / target_ratio)
-                if target_height > height:
-                    target_height = height
-                top = (height - target_height) // 2
-                bottom = top + target_height
-                left = 0
-                right = width
-            else:
-                left = (width - target_width) // 2
-                right = left + target_width
-                top = 0
-                bottom = height
-            img = img.crop((left, top, right, bottom))
-        elif size:
-            try:
-                img = img.resize(size, Image.LANCZOS)
-            except Exception as e:
-                return False, f"调整图片尺寸失败: {str(e)}"
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        img.save(output_path, "JPEG", quality=quality)
-        return True, {"success": True, "message": "封面生成成功", "frame_index": target_frame}
+        # 由提取器选择当前文件类型最快的解码后端
+        try:
+            extracted = extract_frames(video_path, pick_random_time, keyframes_only=keyframes_only,
+                                       size=decode_size(video_path, renditions))
+        except Exception as e:
+            return False, f"无法读取视频帧: {str(e)}"
+        t = extracted.timestamps[0]
+        frame = extracted.frames[0]
+        outputs = render_all(frame, renditions, crop_subjects(frame, renditions))
+        frame_idx = int(t * extracted.fps) if extracted.fps else None
+        return True, {"frame_index": frame_idx, "backend": extracted.backend, "renditions": outputs}
     except Exception as e:
         return False, f"处理视频失败: {str(e)}"
 
+def generate_thumbnail(video_path, output_path, quality=100, size=None, vertical=False):
+    """生成单张封面，vertical 为 True 时截取2:3竖向区域"""
+    rendition = Rendition("thumbnail", output_path, ratio=POSTER_RATIO if vertical else None,
+                          size=size, max_width=MAX_WIDTH, quality=quality)
+    success, result = generate_renditions(video_path, [rendition])
+    if not success:
+        return False, result
+    ok, output = result["renditions"]["thumbnail"]
+    if not ok:
+        return False, output
+    return True, {"success": True, "message": "封面生成成功", "frame_index": result["frame_index"], "backend": result["backend"]}
+
 def choose_folder():
     """选择文件夹的简单实现"""
     root = Tk()
@@ -171,39 +133,50 @@ def choose_folder():
     root.destroy()
     return path
 
-def collect_videos(root_dir, max_depth=2):
-    """收集指定目录下的视频文件"""
-    result = []
-    
-    def walk(dir_path, depth):
-        try:
-            for name in os.listdir(dir_path):
-                p = os.path.join(dir_path, name)
-                if os.path.isfile(p) and any(name.lower().endswith(ext) for ext in SUPPORTED_EXTS):
-                    result.append(p)
-                elif os.path.isdir(p) and depth < max_depth:
-                    walk(p, depth + 1)
-        except Exception:
-            pass  # 忽略无法访问的目录
-    
-    walk(root_dir, 0)
-    return result
+_hash_index = None
+
+def get_hash_index():
+    """当前进程共用的图片哈希索引，首次使用时创建"""
+    global _hash_index
+    if _hash_index is None:
+        _hash_index = HashIndex()
+    return _hash_index
 
-def check_image_files_identical(file1_path, file2_path):
-    """检查两个图片文件是否大小相同（简单判断是否可能为相同图片）"""
+def check_images_near_duplicate(file1_path, file2_path):
+    """用感知哈希判断两张图片是否相同或几乎相同，哈希按文件标识缓存"""
     try:
         if not os.path.exists(file1_path) or not os.path.exists(file2_path):
             return False
-        
-        # 比较文件大小
-        size1 = os.path.getsize(file1_path)
-        size2 = os.path.getsize(file2_path)
-        
-        return size1 == size2
+        duplicate, _, _ = get_hash_index().near_duplicate(file1_path, file2_path)
+        return duplicate
     except Exception as e:
         print(f"⚠️ 检查图片文件时出错: {str(e)}")
         return False
 
+def scan_duplicates(videos):
+    """扫描视频所在目录的poster/fanart，返回近似重复的 [(视频路径, dhash距离, phash距离)]
+    
+    图片未变化时直接使用哈希索引中的结果，不重新打开。
+    """
+    index = get_hash_index()
+    flagged = []
+    video_by_folder = {}
+    for video_path in videos:
+        video_by_folder.setdefault(os.path.dirname(video_path), video_path)
+    for folder, video_path in sorted(video_by_folder.items()):
+        poster_path = os.path.join(folder, "poster.jpg")
+        fanart_path = os.path.join(folder, "fanart.jpg")
+        if not os.path.exists(poster_path) or not os.path.exists(fanart_path):
+            continue
+        try:
+            duplicate, d_dist, p_dist = index.near_duplicate(poster_path, fanart_path)
+        except Exception as e:
+            print(f"⚠️ 无法读取 {folder} 中的图片: {str(e)}")
+            continue
+        if duplicate:
+            flagged.append((video_path, d_dist, p_dist))
+    return flagged
+
 def create_video_folders(videos):
     """为多个视频文件创建单独的文件夹并移动视频文件"""
     # 首先按目录分组视频文件
@@ -263,8 +236,220 @@ def create_video_folders(videos):
     
     return new_video_paths
 
-def main():
+def plan_video(video_path, quality, size):
+    """检查已有的poster/fanart，返回 (结果字典, 需要生成的Rendition列表, {名称: 目标路径})"""
+    lines = []
+    result = {"video": video_path, "poster": "skipped", "fanart": "skipped", "success": 0,
+              "outputs": {}, "lines": lines}
+
+    folder = os.path.dirname(video_path)
+    poster_path = os.path.join(folder, "poster.jpg")
+    fanart_path = os.path.join(folder, "fanart.jpg")
+    targets = {}
+    renditions = []
+
+    if os.path.exists(poster_path):
+        lines.append("➡️ 跳过 poster.jpg（已存在）")
+    else:
+        targets["poster"] = poster_path
+        renditions.append(Rendition("poster", ratio=POSTER_RATIO, max_width=MAX_WIDTH, quality=quality))
+
+    # 检查是否需要重新生成fanart（当poster和fanart相同或几乎相同时）
+    need_regenerate_fanart = False
+    if os.path.exists(fanart_path):
+        if os.path.exists(poster_path) and check_images_near_duplicate(poster_path, fanart_path):
+            lines.append("🔄 发现poster和fanart相同，准备重新生成fanart")
+            try:
+                os.remove(fanart_path)
+                need_regenerate_fanart = True
+                lines.append("🗑️ 已删除相同的fanart")
+            except Exception as e:
+                lines.append(f"⚠️ 删除fanart失败: {str(e)}")
+        else:
+            lines.append("➡️ 跳过 fanart.jpg（已存在且与poster不同）")
+    else:
+        need_regenerate_fanart = True
+
+    if need_regenerate_fanart:
+        # fanart保持完整画面，不使用竖截图
+        targets["fanart"] = fanart_path
+        renditions.append(Rendition("fanart", size=size, max_width=MAX_WIDTH, quality=quality))
+
+    if renditions:
+        lines.append(f"🖼️ 正在生成 {'、'.join(f'{name}.jpg' for name in targets)}...")
+    return result, renditions, targets
+
+def save_renditions(result, renditions, targets, success, generated):
+    """把编码好的图片写入视频所在目录，并在结果字典中记录状态和哈希"""
+    lines = result["lines"]
+    for rendition in renditions:
+        name = rendition.name
+        if not success:
+            result[name] = "failed"
+            lines.append(f"❌ {name}.jpg 生成失败: {generated}")
+            continue
+        ok, output = generated["renditions"][name]
+        if not ok:
+            result[name] = "failed"
+            lines.append(f"❌ {name}.jpg 生成失败: {output}")
+            continue
+        try:
+            write_output(targets[name], output["data"])
+            result["outputs"][name] = hashlib.sha1(output["data"]).hexdigest()
+            result["success"] += 1
+            result[name] = "ok"
+            lines.append(f"✅ {name}.jpg 生成成功，帧索引: {generated['frame_index']}")
+            lines.append(f"📁 保存到: {targets[name]}")
+        except Exception as e:
+            result[name] = "failed"
+            lines.append(f"⚠️ {name}.jpg 生成成功但保存失败: {str(e)}")
+    return result
+
+def process_video(video_path, quality, size, keyframes_only=False):
+    """为单个视频生成poster和fanart，返回结果字典（含待输出的日志行）
+    
+    图片在内存中编码后直接写入目标目录，可在多个工作进程中同时执行。
+    """
+    result, renditions, targets = plan_video(video_path, quality, size)
+    if not renditions:
+        return result
+    # poster和fanart取自同一次解码的同一帧
+    success, generated = generate_renditions(video_path, renditions, keyframes_only=keyframes_only)
+    return save_renditions(result, renditions, targets, success, generated)
+
+def run_videos(videos, quality, size, jobs=1, keyframes_only=False):
+    """依次产出每个视频的处理结果，顺序与输入一致
+    
+    jobs > 1 时使用进程池并行处理，先完成的结果会暂存，直到前面的视频都输出后再产出。
+    """
+    if jobs <= 1:
+        for video_path in videos:
+            yield process_video(video_path, quality, size, keyframes_only)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(process_video, video_path, quality, size, keyframes_only) for video_path in videos]
+        for video_path, future in zip(videos, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"video": video_path, "poster": "failed", "fanart": "failed", "success": 0,
+                       "outputs": {}, "lines": [f"❌ 工作进程处理失败: {str(e)}"]}
+
+# 流水线各阶段的默认线程数，可用 --stage-workers 覆盖
+DEFAULT_STAGE_WORKERS = {
+    "plan": 2,
+    "probe": 2,
+    "decode": max(1, (os.cpu_count() or 2) // 2),
+    "score": 1,
+    "encode": 2,
+    "write": 4,
+}
+
+def build_pipeline_stages(quality, size, keyframes_only=False, workers=None, controller=None):
+    """walk之后的各阶段：plan → probe → decode → score → encode → write
+    
+    提供 controller（AdaptiveController）时，解码阶段的并发数和ffmpeg线程数由它动态决定。
+    """
+    workers = {**DEFAULT_STAGE_WORKERS, **(workers or {})}
+    if controller:
+        workers["decode"] = controller.max_jobs
+
+    def plan(item):
+        item["result"], item["renditions"], item["targets"] = plan_video(item["video"], quality, size)
+        item["done"] = not item["renditions"]
+        return item
+
+    def probe(item):
+        # 预先读取并缓存元数据，解码阶段直接命中缓存
+        try:
+            media_probe.probe(item["video"])
+        except Exception:
+            pass  # 由解码阶段的后端自行处理
+        return item
+
+    def decode(item):
+        size = decode_size(item["video"], item["renditions"])
+        if controller is None:
+            item["extracted"] = extract_frames(item["video"], pick_random_time, keyframes_only=keyframes_only,
+                                               size=size)
+            return item
+        with controller.slot() as threads:
+            item["extracted"] = extract_frames(item["video"], pick_random_time,
+                                               keyframes_only=keyframes_only, threads=threads, size=size)
+        return item
+
+    def score(item):
+        extracted = item["extracted"]
+        item["frame"] = extracted.frames[0]
+        item["subjects"] = crop_subjects(item["frame"], item["renditions"])
+        t = extracted.timestamps[0]
+        item["frame_index"] = int(t * extracted.fps) if extracted.fps else None
+        return item
+
+    def encode(item):
+        outputs = render_all(item.pop("frame"), item["renditions"], item.pop("subjects"))
+        item["generated"] = {"frame_index": item["frame_index"], "backend": item["extracted"].backend,
+                             "renditions": outputs}
+        item.pop("extracted")
+        return item
+
+    def write(item):
+        save_renditions(item["result"], item["renditions"], item["targets"], True, item["generated"])
+        item.pop("generated")
+        return item
+
+    funcs = [("plan", plan), ("probe", probe), ("decode", decode), ("score", score), ("encode", encode), ("write", write)]
+    return [Stage(name, func, workers=workers[name]) for name, func in funcs]
+
+def run_videos_pipeline(videos, quality, size, keyframes_only=False, workers=None, controller=None):
+    """用分阶段流水线处理视频，按完成顺序产出结果字典"""
+    stages = build_pipeline_stages(quality, size, keyframes_only, workers, controller)
+    for item in run_pipeline(({"video": v} for v in videos), stages):
+        result = item["result"] if "result" in item else {
+            "video": item["video"], "poster": "failed", "fanart": "failed", "success": 0, "outputs": {}, "lines": []}
+        if item.get("error"):
+            for rendition in item.get("renditions", []):
+                result[rendition.name] = "failed"
+            result["lines"].append(f"❌ 处理失败: {item['error']}")
+        yield result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="视频封面生成工具（简化版）")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="并行处理的进程数，默认1（逐个处理）")
+    parser.add_argument("--keyframes", action="store_true",
+                        help="快速模式：截图时间点对齐到关键帧，只解码关键帧")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="使用分阶段流水线（probe/解码/编码/写入并行重叠）")
+    parser.add_argument("--stage-workers", default="",
+                        help="流水线各阶段的线程数，例如 decode=4,write=8")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="流水线模式下根据实测速度和I/O等待自动调整解码并发数和ffmpeg线程数")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="进度日志文件路径，默认为所选文件夹下的 .thumbnail_journal.db")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="不使用进度日志，重新检查所有视频")
+    parser.add_argument("--dedupe-scan", action="store_true",
+                        help="扫描整个媒体库中近似重复的poster/fanart，并只为这些视频重新生成fanart")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs 必须大于等于1")
+    try:
+        args.stage_workers = parse_stage_workers(args.stage_workers)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = set(args.stage_workers) - set(DEFAULT_STAGE_WORKERS)
+    if unknown:
+        parser.error(f"未知的流水线阶段: {', '.join(sorted(unknown))}")
+    if args.adaptive:
+        args.pipeline = True
+    return args
+
+def main(argv=None):
     """主函数 - 简化版批量处理视频"""
+    args = parse_args(argv)
+    jobs = args.jobs
     print("🎬 视频封面生成工具（简化版）")
     print("⚡ 模式: 随机截取视频帧，快速生成封面")
     print("📂 功能: 自动为多视频文件夹创建单独目录结构")
@@ -302,82 +487,83 @@ def main():
     quality = 100  # 最高质量 - 保持原图质量
     size = None  # 不调整尺寸，保持原始大小
     
-    # 创建临时目录
-    temp_dir = os.path.join(tempfile.gettempdir(), "thumbnails")
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_output = os.path.join(temp_dir, "temp_thumbnail.jpg")
+    # 进度日志：跳过上次已完成的视频，中断后可继续
+    journal = None
+    if not args.no_journal:
+        journal_path = args.journal or default_journal_path(folder_path)
+        try:
+            journal = BatchJournal(journal_path)
+        except Exception as e:
+            print(f"⚠️ 无法打开进度日志 {journal_path}: {str(e)}，本次不记录进度")
+    dir_mtimes = {}
     
     # 收集视频文件
-    videos = collect_videos(folder_path, max_depth=2)
+    videos = collect_videos(folder_path, max_depth=2, exts=SUPPORTED_EXTS, journal=journal, dir_mtimes=dir_mtimes)
     if not videos:
         print("⚠️ 选中文件夹下未发现支持的视频文件")
         return
     
     print(f"⏳ 共找到 {len(videos)} 个视频，开始处理...")
     
-    # 为多个视频创建单独的文件夹
-    videos_to_process = create_video_folders(videos)
+    if args.dedupe_scan:
+        # 只处理poster和fanart近似重复的视频，不移动文件
+        print("🔍 正在扫描近似重复的poster/fanart...")
+        flagged = scan_duplicates(videos)
+        for video_path, d_dist, p_dist in flagged:
+            print(f"🔄 {os.path.dirname(video_path)}: poster与fanart近似重复（dHash距离 {d_dist}，pHash距离 {p_dist}）")
+        print(f"📋 共发现 {len(flagged)} 对近似重复的图片")
+        if not flagged:
+            return
+        videos_to_process = [video_path for video_path, _, _ in flagged]
+    else:
+        # 为多个视频创建单独的文件夹
+        videos_to_process = create_video_folders(videos)
+        if journal:
+            completed = journal.completed(videos_to_process, dir_mtimes)
+            if completed:
+                print(f"⏭️ 根据进度日志跳过 {len(completed)} 个已完成的视频")
+                videos_to_process = [v for v in videos_to_process if v not in completed]
+            if not videos_to_process:
+                print("✅ 所有视频均已处理完成")
+                return
     
     # 批量处理视频生成封面
-    success_count = 0
     print(f"\n🎨 开始为 {len(videos_to_process)} 个视频生成封面...")
-
-    for i, video_path in enumerate(videos_to_process, 1):
-        video_name = os.path.basename(video_path)
-        print(f"\n🎞️ 处理 ({i}/{len(videos_to_process)}): {video_name}")
-
-        folder = os.path.dirname(video_path)
-        poster_path = os.path.join(folder, "poster.jpg")
-        fanart_path = os.path.join(folder, "fanart.jpg")
-
-        if os.path.exists(poster_path):
-            print("➡️ 跳过 poster.jpg（已存在）")
-        else:
-            print("🖼️ 正在生成2:3比例竖截图作为poster...")
-            success_poster, result_poster = generate_thumbnail(video_path, temp_output, quality=quality, vertical=True)
-            if success_poster:
-                try:
-                    shutil.copy2(temp_output, poster_path)
-                    success_count += 1
-                    frame_idx = result_poster.get("frame_index")
-                    print(f"✅ poster.jpg 生成成功，帧索引: {frame_idx}")
-                    print(f"📁 保存到: {poster_path}")
-                except Exception as e:
-                    print(f"⚠️ poster.jpg 生成成功但保存失败: {str(e)}")
-            else:
-                print(f"❌ poster.jpg 生成失败: {result_poster}")
-
-        # 检查是否需要重新生成fanart（当poster和fanart存在且大小相同时）
-        need_regenerate_fanart = False
-        if os.path.exists(fanart_path):
-            if os.path.exists(poster_path) and check_image_files_identical(poster_path, fanart_path):
-                print("🔄 发现poster和fanart相同，准备重新生成fanart")
-                try:
-                    os.remove(fanart_path)
-                    need_regenerate_fanart = True
-                    print("🗑️ 已删除相同的fanart")
-                except Exception as e:
-                    print(f"⚠️ 删除fanart失败: {str(e)}")
-            else:
-                print("➡️ 跳过 fanart.jpg（已存在且与poster不同）")
-        else:
-            need_regenerate_fanart = True
-        
-        if need_regenerate_fanart:
-            print("🎨 正在生成fanart...")
-            # fanart保持原有逻辑，不使用竖截图
-            success_fanart, result_fanart = generate_thumbnail(video_path, temp_output, quality=quality, size=size)
-            if success_fanart:
-                try:
-                    shutil.copy2(temp_output, fanart_path)
-                    success_count += 1
-                    frame_idx = result_fanart.get("frame_index")
-                    print(f"✅ fanart.jpg 生成成功，帧索引: {frame_idx}")
-                    print(f"📁 保存到: {fanart_path}")
-                except Exception as e:
-                    print(f"⚠️ fanart.jpg 生成成功但保存失败: {str(e)}")
-            else:
-                print(f"❌ fanart.jpg 生成失败: {result_fanart}")
+    controller = None
+    if args.pipeline:
+        stage_workers = {**DEFAULT_STAGE_WORKERS, **args.stage_workers}
+        if args.adaptive:
+            # 解码并发从核数的一半开始，由控制器在 1..核数 之间调整
+            controller = AdaptiveController(max_jobs=args.stage_workers.get("decode"))
+            stage_workers["decode"] = f"自适应(初始{controller.limit})"
+        print("⚙️ 流水线模式: " + ", ".join(f"{name}×{n}" for name, n in stage_workers.items()))
+        processed = run_videos_pipeline(videos_to_process, quality, size, args.keyframes,
+                                        args.stage_workers, controller)
+    else:
+        if jobs > 1:
+            print(f"⚙️ 并行模式: {jobs} 个工作进程")
+        processed = run_videos(videos_to_process, quality, size, jobs, args.keyframes)
+    if args.keyframes:
+        print("⚡ 快速模式: 只解码关键帧")
+    results = []
+    for i, result in enumerate(processed, 1):
+        print(f"\n🎞️ 处理 ({i}/{len(videos_to_process)}): {os.path.basename(result['video'])}")
+        for line in result["lines"]:
+            print(line)
+        if journal:
+            failed = "failed" in (result["poster"], result["fanart"])
+            journal.record(result["video"], FAILED if failed else DONE, result["outputs"])
+        results.append(result)
+    success_count = sum(r["success"] for r in results)
+    
+    # 每个视频的结果汇总
+    print("\n📋 结果汇总:")
+    for r in results:
+        print(f"  {os.path.basename(r['video'])}: poster {r['poster']}, fanart {r['fanart']}")
+    
+    if controller and controller.history:
+        best = max(controller.history, key=lambda h: h["rate"])
+        print(f"\n⚙️ 最快的解码并发数: {best['jobs']}（{best['rate']:.2f} 个/秒）")
     
     # 总结
     print(f"\n📊 处理完成: 成功 {success_count} / {len(videos_to_process)}")
@@ -0,0 +1,109 @@
+"""批量处理的进度日志
+
+记录每个视频的处理状态、输出图片的哈希、源视频的大小和修改时间，以及处理完成时
+所在目录的修改时间；同时缓存每个目录的子目录和视频列表。再次运行时：
+
+- 目录修改时间未变的，直接使用记录的列表，不再列出目录内容；
+- 视频已完成且所在目录未变化的，直接跳过，不再检查 poster.jpg/fanart.jpg。
+
+每处理完一个视频立即写入，中途中断后重新运行即可从断点继续。
+日志默认保存在所选的媒体库目录中，与生成的图片放在一起，不会随系统清理临时目录而丢失。
+"""
+import json
+import os
+import threading
+import time
+
+from sqlite_util import connect
+
+JOURNAL_FILENAME = ".thumbnail_journal.db"
+
+# 每处理完一个视频都会写入，WAL模式下不必每次提交都同步到磁盘
+_PRAGMAS = ("synchronous=NORMAL",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    dir_mtime_ns INTEGER,
+    status TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL,
+    videos TEXT NOT NULL
+);
+"""
+
+DONE = "done"
+FAILED = "failed"
+
+
+def default_path(folder):
+    """媒体库目录下的默认日志路径"""
+    return os.path.join(folder, JOURNAL_FILENAME)
+
+
+class BatchJournal:
+    """基于SQLite的批量处理日志"""
+
+    def __init__(self, db_path):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with connect(self._db_path, _PRAGMAS) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def get_dir(self, dir_path, mtime_ns):
+        """目录未变化时返回记录的 (子目录名列表, 视频文件名列表)，否则返回None"""
+        with self._lock, connect(self._db_path, _PRAGMAS) as conn:
+            row = conn.execute(
+                "SELECT subdirs, videos FROM dirs WHERE path = ? AND mtime_ns = ?", (dir_path, mtime_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put_dir(self, dir_path, mtime_ns, subdirs, videos):
+        with self._lock, connect(self._db_path, _PRAGMAS) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, subdirs, videos) VALUES (?, ?, ?, ?)",
+                (dir_path, mtime_ns, json.dumps(subdirs), json.dumps(videos))
+            )
+
+    def completed(self, video_paths, dir_mtimes):
+        """返回已完成且所在目录自完成后未变化的视频集合
+
+        dir_mtimes: {目录路径: 当前修改时间}，一般由遍历目录时顺便得到
+        """
+        done = set()
+        with self._lock, connect(self._db_path, _PRAGMAS) as conn:
+            for path, dir_mtime_ns in conn.execute(
+                "SELECT path, dir_mtime_ns FROM videos WHERE status = ?", (DONE,)
+            ):
+                if dir_mtimes.get(os.path.dirname(path)) == dir_mtime_ns:
+                    done.add(path)
+        return done & set(video_paths)
+
+    def record(self, video_path, status, outputs=None):
+        """记录一个视频的处理结果；在输出写入之后调用，以记录目录的最终修改时间"""
+        try:
+            st = os.stat(video_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        try:
+            dir_mtime_ns = os.stat(os.path.dirname(video_path)).st_mtime_ns
+        except OSError:
+            dir_mtime_ns = None
+        with self._lock, connect(self._db_path, _PRAGMAS) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO videos (path, size, mtime_ns, dir_mtime_ns, status, outputs, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_path, size, mtime_ns, dir_mtime_ns, status, json.dumps(outputs or {}), time.time())
+            )
@@ -0,0 +1,120 @@
+"""解码端缩放的画质等价检查
+
+对比两种得到 fanart 尺寸帧的方式：
+
+- 原做法：按源分辨率解码，再用PIL的LANCZOS缩放到目标尺寸；
+- 新做法：extract_frames(..., size=...)，由解码端（ffmpeg的scale滤镜等）直接输出目标尺寸。
+
+对同一批时间点，逐帧计算两者的PSNR，并记录各自的耗时和帧数组大小。
+任一后端的最低PSNR低于 --min-psnr 时以非零状态退出。
+
+默认使用 extraction_bench 生成的4K合成视频，也可以传入自己的视频文件。
+
+用法:
+    python benchmarks/downscale_equivalence.py [--size 1920x1080] [--min-psnr 30] [视频 ...]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import frame_extractor  # noqa: E402
+from extraction_bench import DEFAULT_CORPUS_DIR, build_corpus, corpus_specs  # noqa: E402
+
+# 取帧位置（占时长的比例），固定以便两种方式解码同一帧
+POSITIONS = [0.2, 0.5, 0.8]
+
+
+def psnr(a, b):
+    """两帧之间的PSNR（dB），完全相同时返回 inf"""
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+
+
+def pick_times(duration):
+    return [duration * p for p in POSITIONS]
+
+
+def compare_backend(video_path, backend, size):
+    """用同一后端分别按两种方式取帧，返回对比结果字典"""
+    extractor = frame_extractor.FrameExtractor(stats_path=None, backends=[backend])
+
+    start = time.perf_counter()
+    full = extractor.extract(video_path, pick_times)
+    reference = np.stack([
+        np.asarray(Image.fromarray(frame).resize(size, Image.LANCZOS)) for frame in full.frames
+    ])
+    old_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scaled = extractor.extract(video_path, pick_times, size=size)
+    new_seconds = time.perf_counter() - start
+
+    if scaled.frames.shape != reference.shape:
+        raise RuntimeError(f"输出尺寸不符: {scaled.frames.shape} != {reference.shape}")
+    values = [psnr(a, b) for a, b in zip(reference, scaled.frames)]
+    return {
+        "min_psnr_db": round(min(values), 2),
+        "mean_psnr_db": round(sum(values) / len(values), 2),
+        "old_ms": round(old_seconds * 1000, 1),
+        "new_ms": round(new_seconds * 1000, 1),
+        "old_frame_bytes": int(full.frames.nbytes),
+        "new_frame_bytes": int(scaled.frames.nbytes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解码端缩放与PIL缩放的画质对比")
+    parser.add_argument("videos", nargs="*", help="要检查的视频，默认使用合成的4K视频")
+    parser.add_argument("--size", default="1920x1080", help="目标尺寸，宽x高")
+    parser.add_argument("--codecs", default="h264,hevc,mpeg4", help="合成视频的编码格式，逗号分隔")
+    parser.add_argument("--backends", default="ffmpeg,opencv,moviepy", help="解码后端，逗号分隔")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="合成视频的缓存目录")
+    parser.add_argument("--min-psnr", type=float, default=30.0, help="允许的最低PSNR（dB）")
+    args = parser.parse_args()
+
+    width, _, height = args.size.lower().partition("x")
+    size = (int(width), int(height))
+    videos = args.videos
+    if not videos:
+        codecs = [c.strip() for c in args.codecs.split(",") if c.strip()]
+        videos = [spec["path"] for spec in build_corpus(args.corpus_dir, corpus_specs(codecs, ["2160p"], [10], [250]))]
+    names = {name.strip() for name in args.backends.split(",") if name.strip()}
+    backends = [b for b in frame_extractor.BACKENDS if b.name in names]
+
+    results, failed = {}, []
+    for video_path in videos:
+        name = os.path.basename(video_path)
+        for backend in backends:
+            try:
+                entry = compare_backend(video_path, backend, size)
+            except Exception as e:
+                entry = {"error": str(e)[:300]}
+                print(f"⚠️ {name} / {backend.name}: {entry['error']}", file=sys.stderr)
+            else:
+                ok = entry["min_psnr_db"] >= args.min_psnr
+                print(f"{'✅' if ok else '❌'} {name} / {backend.name}: 最低PSNR {entry['min_psnr_db']:.1f}dB，"
+                      f"耗时 {entry['old_ms']:.0f}ms → {entry['new_ms']:.0f}ms，"
+                      f"帧数据 {entry['old_frame_bytes'] / 2 ** 20:.1f}MB → {entry['new_frame_bytes'] / 2 ** 20:.1f}MB",
+                      file=sys.stderr)
+                if not ok:
+                    failed.append(f"{name}/{backend.name}")
+            results.setdefault(name, {})[backend.name] = entry
+
+    print(json.dumps({"size": list(size), "min_psnr_db": args.min_psnr, "results": results},
+                     ensure_ascii=False, indent=2, sort_keys=True))
+    if failed:
+        print(f"❌ 画质低于下限: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""帧提取基准
+
+用ffmpeg的 testsrc2 测试源生成一组合成视频（多种编码格式、分辨率、时长和关键帧间隔），
+分别强制使用 ffmpeg、opencv、moviepy 解码后端，对语料中的每个视频运行
+auto_thumbnail.generate_random_thumbnail() 和 auto_thumbnail_simple.generate_thumbnail()，
+输出各后端的耗时分位数、峰值内存和读取字节数。
+
+每个（函数, 后端）组合在独立的子进程中运行，峰值RSS互不影响。峰值RSS只统计Python进程
+（帧数组都在这里），ffmpeg子进程fork时会继承父进程的RSS峰值，无法单独准确统计。
+读取量来自 /proc/self/io（已回收的ffmpeg子进程也计入）：read_bytes 是实际从存储读取的
+字节数（语料在页缓存中时接近0），read_chars 是所有read调用读到的字节数，包括从ffmpeg
+管道读取的帧数据。
+
+语料按参数命名并缓存，重复运行不会重新生成；随机时间点使用固定种子，
+输出的JSON按键排序，可以直接在两次提交之间diff，或用 --baseline 检查耗时退化。
+
+用法:
+    python benchmarks/extraction_bench.py [--quick] [--runs 3] [--output result.json]
+    python benchmarks/extraction_bench.py --baseline old.json [--max-regression 0.2]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "thumbnails", "bench_corpus")
+
+# 编码格式: (扩展名, ffmpeg编码参数)
+CODECS = {
+    "h264": (".mp4", ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]),
+    "hevc": (".mkv", ["-c:v", "libx265", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+                      "-x265-params", "log-level=error"]),
+    "vp9": (".webm", ["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "2M"]),
+    "mpeg4": (".avi", ["-c:v", "mpeg4", "-q:v", "4"]),
+    "flv1": (".flv", ["-c:v", "flv", "-q:v", "4"]),
+    "wmv2": (".wmv", ["-c:v", "wmv2", "-q:v", "4"]),
+    "mjpeg": (".mov", ["-c:v", "mjpeg", "-q:v", "4"]),
+}
+RESOLUTIONS = {"360p": (640, 360), "1080p": (1920, 1080), "2160p": (3840, 2160)}
+DURATIONS = [10, 60]
+GOPS = [12, 250]
+FRAME_RATE = 24
+
+BACKENDS = ["ffmpeg", "opencv", "moviepy"]
+FUNCTIONS = ["generate_random_thumbnail", "generate_thumbnail"]
+
+
+def _split(value):
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def corpus_specs(codecs, resolutions, durations, gops):
+    """语料中每个视频的参数"""
+    specs = []
+    for codec in codecs:
+        ext = CODECS[codec][0]
+        for resolution in resolutions:
+            width, height = RESOLUTIONS[resolution]
+            for duration in durations:
+                for gop in gops:
+                    specs.append({
+                        "name": f"{codec}_{resolution}_{duration}s_gop{gop}{ext}",
+                        "codec": codec, "ext": ext, "width": width, "height": height,
+                        "duration": duration, "gop": gop,
+                    })
+    return specs
+
+
+def build_corpus(corpus_dir, specs):
+    """生成缺少的视频，返回带路径和文件大小的参数列表；本机ffmpeg不支持的编码会被跳过"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    built = []
+    for spec in specs:
+        path = os.path.join(corpus_dir, spec["name"])
+        if not os.path.exists(path):
+            print(f"🎞️ 生成测试视频: {spec['name']}", file=sys.stderr)
+            tmp_path = f"{path}.tmp{spec['ext']}"
+            cmd = [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "lavfi",
+                "-i", f"testsrc2=size={spec['width']}x{spec['height']}:rate={FRAME_RATE}:duration={spec['duration']}",
+                *CODECS[spec["codec"]][1], "-g", str(spec["gop"]), "-an",
+                "-fflags", "+bitexact", "-flags:v", "+bitexact", tmp_path,
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"⚠️ 跳过 {spec['name']}: {result.stderr.strip()[-200:]}", file=sys.stderr)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            os.replace(tmp_path, path)
+        built.append(dict(spec, path=path, size_bytes=os.path.getsize(path)))
+    return built
+
+
+def percentile(sorted_values, p):
+    """线性插值的百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def read_proc_io():
+    """读取 /proc/self/io，不支持的系统返回None"""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            return {key: int(value) for key, value in (line.split(":") for line in f)}
+    except OSError:
+        return None
+
+
+def run_worker(func_name, backend_name, paths, runs, seed):
+    """在当前进程中强制使用指定后端运行函数，打印一行JSON结果"""
+    sys.path.insert(0, REPO_DIR)
+    import frame_extractor
+    import media_probe
+
+    probe_dir = tempfile.TemporaryDirectory()
+    # 每次基准使用全新的探测缓存和后端统计，避免受之前运行的影响
+    media_probe._default_probe = media_probe.MediaProbe(os.path.join(probe_dir.name, "probe.db"))
+    backends = [b for b in frame_extractor.BACKENDS if b.name == backend_name]
+    frame_extractor.default_extractor = frame_extractor.FrameExtractor(stats_path=None, backends=backends)
+
+    if func_name == "generate_random_thumbnail":
+        from auto_thumbnail import generate_random_thumbnail
+
+        def call(path):
+            return generate_random_thumbnail(path, io.BytesIO())
+    else:
+        from auto_thumbnail_simple import generate_thumbnail
+
+        def call(path):
+            return generate_thumbnail(path, io.BytesIO())
+
+    # 预热一次，排除首次导入cv2、moviepy等依赖的耗时
+    random.seed(seed)
+    call(paths[0])
+
+    samples = []
+    io_start = read_proc_io()
+    for run in range(runs):
+        random.seed(seed + run)
+        for path in paths:
+            start = time.perf_counter()
+            ok, result = call(path)
+            seconds = time.perf_counter() - start
+            samples.append({
+                "path": path, "ok": ok, "seconds": seconds,
+                "backend": result.get("backend") if ok else None,
+                "error": None if ok else str(result)[:200],
+            })
+    io_end = read_proc_io()
+    probe_dir.cleanup()
+
+    report = {
+        "samples": samples,
+        # Linux上 ru_maxrss 的单位是KB
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "read_bytes": io_end["read_bytes"] - io_start["read_bytes"] if io_start and io_end else None,
+        "read_chars": io_end["rchar"] - io_start["rchar"] if io_start and io_end else None,
+    }
+    print(json.dumps(report))
+
+
+def summarize(worker, corpus):
+    """把子进程结果汇总为分位数等指标"""
+    ext_by_path = {spec["path"]: spec["ext"] for spec in corpus}
+    ok_samples = [s for s in worker["samples"] if s["ok"]]
+    times = sorted(s["seconds"] * 1000 for s in ok_samples)
+    by_ext = {}
+    for s in ok_samples:
+        by_ext.setdefault(ext_by_path[s["path"]], []).append(s["seconds"] * 1000)
+    failures = [s for s in worker["samples"] if not s["ok"]]
+
+    def ms(value):
+        return round(value, 2) if value is not None else None
+
+    return {
+        "calls": len(worker["samples"]),
+        "failures": len(failures),
+        "failed_files": sorted({os.path.basename(s["path"]) for s in failures}),
+        "backends_used": sorted({s["backend"] for s in ok_samples}),
+        "p50_ms": ms(percentile(times, 50)),
+        "p90_ms": ms(percentile(times, 90)),
+        "p99_ms": ms(percentile(times, 99)),
+        "mean_ms": ms(statistics.fmean(times)) if times else None,
+        "max_ms": ms(times[-1]) if times else None,
+        "p50_ms_by_ext": {ext: ms(statistics.median(values)) for ext, values in sorted(by_ext.items())},
+        "peak_rss_mb": round(worker["peak_rss_kb"] / 1024, 1),
+        "read_bytes": worker["read_bytes"],
+        "read_chars": worker["read_chars"],
+    }
+
+
+def environment():
+    """记录影响结果的环境信息"""
+    info = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+    try:
+        version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout
+        info["ffmpeg"] = version.splitlines()[0] if version else None
+    except OSError:
+        info["ffmpeg"] = None
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        info["commit"] = None
+    return info
+
+
+def compare(report, baseline, max_regression):
+    """与基线比较各组合的p50耗时，返回退化超过上限的描述列表"""
+    regressions = []
+    if [c["name"] for c in report["corpus"]] != [c["name"] for c in baseline.get("corpus", [])]:
+        print("⚠️ 基线使用的测试视频不同，耗时不可直接比较", file=sys.stderr)
+    for func_name, backends in report["results"].items():
+        for backend_name, summary in backends.items():
+            old = baseline.get("results", {}).get(func_name, {}).get(backend_name, {})
+            old_p50, new_p50 = old.get("p50_ms"), summary.get("p50_ms")
+            if not old_p50 or new_p50 is None:
+                continue
+            change = new_p50 / old_p50 - 1
+            print(f"{'❌' if change > max_regression else '✅'} {func_name}/{backend_name}: "
+                  f"p50 {old_p50:.1f}ms → {new_p50:.1f}ms ({change:+.0%})", file=sys.stderr)
+            if change > max_regression:
+                regressions.append(f"{func_name}/{backend_name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧提取后端基准")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="合成视频的缓存目录")
+    parser.add_argument("--codecs", default=",".join(CODECS), help="编码格式，逗号分隔")
+    parser.add_argument("--resolutions", default="360p,1080p", help=f"分辨率，可选 {','.join(RESOLUTIONS)}")
+    parser.add_argument("--durations", default=",".join(map(str, DURATIONS)), help="时长（秒），逗号分隔")
+    parser.add_argument("--gops", default=",".join(map(str, GOPS)), help="关键帧间隔（帧），逗号分隔")
+    parser.add_argument("--quick", action="store_true", help="只用360p、10秒、GOP 250的视频")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="解码后端，逗号分隔")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS), help="被测函数，逗号分隔")
+    parser.add_argument("--runs", type=int, default=3, help="每个视频的重复次数")
+    parser.add_argument("--seed", type=int, default=1234, help="随机时间点的种子")
+    parser.add_argument("--output", help="结果JSON的保存路径，默认输出到标准输出")
+    parser.add_argument("--baseline", help="之前保存的结果JSON，用于检查耗时退化")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="p50耗时允许的最大增幅")
+    parser.add_argument("--worker", nargs=2, metavar=("FUNCTION", "BACKEND"), help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.paths, args.runs, args.seed)
+        return 0
+
+    if args.quick:
+        args.resolutions, args.durations, args.gops = "360p", "10", "250"
+    specs = corpus_specs(
+        _split(args.codecs), _split(args.resolutions),
+        [int(d) for d in _split(args.durations)], [int(g) for g in _split(args.gops)]
+    )
+    corpus = build_corpus(args.corpus_dir, specs)
+    if not corpus:
+        print("❌ 无法生成任何测试视频，请确认已安装ffmpeg", file=sys.stderr)
+        return 1
+    paths = [spec["path"] for spec in corpus]
+
+    results = {}
+    for func_name in _split(args.functions):
+        for backend_name in _split(args.backends):
+            print(f"⏱️ {func_name} / {backend_name}", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", func_name, backend_name,
+                 "--runs", str(args.runs), "--seed", str(args.seed), *paths],
+                cwd=REPO_DIR, capture_output=True, text=True
+            )
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                print(f"⚠️ 基准进程失败: {proc.stderr.strip()[-500:]}", file=sys.stderr)
+                results.setdefault(func_name, {})[backend_name] = {"error": proc.stderr.strip()[-500:]}
+                continue
+            results.setdefault(func_name, {})[backend_name] = summarize(json.loads(lines[-1]), corpus)
+
+    report = {
+        "environment": environment(),
+        "settings": {"runs": args.runs, "seed": args.seed, "frame_rate": FRAME_RATE},
+        "corpus": [{k: v for k, v in spec.items() if k != "path"} for spec in corpus],
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ 结果已保存到 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ 耗时退化: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
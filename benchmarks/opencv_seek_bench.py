@@ -0,0 +1,126 @@
+"""OpenCV后端seek策略基准
+
+对每种支持的扩展名（使用 extraction_bench 生成的合成视频），比较读取同一批候选帧的三种方式：
+
+- random_seek：按随机顺序逐个 cap.set(CAP_PROP_POS_FRAMES) 再 read()（最初的回退实现）；
+- sorted_seek：先排序，再逐个 cap.set(CAP_PROP_POS_FRAMES)；
+- forward_grab：OpenCVSource.read_frames，排序后相近目标之间用 grab() 向前跳帧，
+  只在远距离或后退时按时间戳seek。
+
+输出每种方式读取耗时的中位数，以及与 sorted_seek 所得帧的平均像素差（检查是否取到同一帧）。
+
+用法:
+    python benchmarks/opencv_seek_bench.py [--candidates 5,20] [--runs 3] [--gops 12,250]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from frame_extractor import OpenCVSource  # noqa: E402
+from extraction_bench import CODECS, DEFAULT_CORPUS_DIR, build_corpus, corpus_specs  # noqa: E402
+
+
+def read_by_frame_seek(video_path, timestamps):
+    """逐个按帧序号seek读取，按传入顺序返回 {时间点: 帧}"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = {}
+        for t in timestamps:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(t * fps))
+            ret, bgr = cap.read()
+            if ret:
+                frames[t] = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        return frames
+    finally:
+        cap.release()
+
+
+def read_forward(video_path, timestamps):
+    source = OpenCVSource(video_path)
+    try:
+        times, frames = source.read_frames(timestamps)
+        return dict(zip(times, frames))
+    finally:
+        source.close()
+
+
+STRATEGIES = {
+    "random_seek": lambda path, times: read_by_frame_seek(path, random.sample(times, len(times))),
+    "sorted_seek": lambda path, times: read_by_frame_seek(path, sorted(times)),
+    "forward_grab": read_forward,
+}
+
+
+def mean_abs_diff(frames, reference):
+    """两组帧在共同时间点上的最大平均像素差"""
+    diffs = [
+        float(np.mean(np.abs(frames[t].astype(np.int16) - reference[t].astype(np.int16))))
+        for t in reference if t in frames
+    ]
+    return round(max(diffs), 3) if diffs else None
+
+
+def bench_video(video_path, duration, count, runs, seed):
+    rng = random.Random(seed)
+    timestamps = [rng.uniform(duration * 0.1, duration * 0.9) for _ in range(count)]
+    results = {}
+    reference = None
+    for name, strategy in STRATEGIES.items():
+        samples, frames = [], None
+        for run in range(runs):
+            random.seed(seed + run)
+            start = time.perf_counter()
+            frames = strategy(video_path, timestamps)
+            samples.append(time.perf_counter() - start)
+        if name == "sorted_seek":
+            reference = frames
+        results[name] = {"median_ms": round(statistics.median(samples) * 1000, 1), "frames": len(frames),
+                         "_frames": frames}
+    baseline = results["random_seek"]["median_ms"]
+    for name, entry in results.items():
+        entry["max_mean_abs_diff"] = mean_abs_diff(entry.pop("_frames"), reference)
+        entry["speedup_vs_random_seek"] = round(baseline / entry["median_ms"], 2) if entry["median_ms"] else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenCV后端seek策略基准")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="合成视频的缓存目录")
+    parser.add_argument("--codecs", default=",".join(CODECS), help="编码格式（每种对应一个扩展名），逗号分隔")
+    parser.add_argument("--resolution", default="360p", help="合成视频的分辨率")
+    parser.add_argument("--duration", type=int, default=60, help="合成视频的时长（秒）")
+    parser.add_argument("--gops", default="12,250", help="关键帧间隔（帧），逗号分隔")
+    parser.add_argument("--candidates", default="5,20", help="每次读取的候选帧数，逗号分隔")
+    parser.add_argument("--runs", type=int, default=3, help="每种方式的重复次数")
+    parser.add_argument("--seed", type=int, default=1234, help="候选时间点的种子")
+    args = parser.parse_args()
+
+    codecs = [c.strip() for c in args.codecs.split(",") if c.strip()]
+    gops = [int(g) for g in args.gops.split(",") if g.strip()]
+    corpus = build_corpus(args.corpus_dir, corpus_specs(codecs, [args.resolution], [args.duration], gops))
+
+    results = {}
+    for spec in corpus:
+        for count in (int(c) for c in args.candidates.split(",") if c.strip()):
+            entry = bench_video(spec["path"], spec["duration"], count, args.runs, args.seed)
+            results.setdefault(spec["name"], {})[f"{count}_candidates"] = entry
+            summary = "，".join(f"{name} {e['median_ms']:.0f}ms" for name, e in entry.items())
+            print(f"⏱️ {spec['name']} × {count}: {summary}", file=sys.stderr)
+
+    print(json.dumps({"settings": vars(args), "results": results}, ensure_ascii=False, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
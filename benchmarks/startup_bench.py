@@ -0,0 +1,97 @@
+"""Web服务启动耗时基准
+
+在全新的子进程中多次导入 auto_thumbnail，统计导入耗时中位数，并借助
+python -X importtime 列出耗时最多的模块。导入后若已加载了重量级依赖（cv2、numpy、
+moviepy、PIL），或耗时超过 --max-seconds，则以非零状态退出，便于在CI中发现启动退化。
+
+用法:
+    python benchmarks/startup_bench.py [--runs 5] [--max-seconds 1.0] [--top 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 这些模块应当延迟到后台预热或第一次生成时才加载
+HEAVY_MODULES = ["cv2", "numpy", "moviepy", "PIL"]
+
+_PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import auto_thumbnail\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({'seconds': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))\n"
+) % (HEAVY_MODULES,)
+
+
+def _run(extra_args=()):
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", _PROBE],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    )
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 [(累计微秒, 模块名)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头
+        rows.append((cumulative, parts[2].strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="auto_thumbnail 导入耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="重复测量次数")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="导入耗时中位数上限（秒）")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的模块数")
+    args = parser.parse_args()
+
+    samples = []
+    heavy = set()
+    for _ in range(args.runs):
+        result = json.loads(_run().stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy.update(result["heavy"])
+
+    # 单独跑一次 importtime，查看是哪些模块拖慢了启动
+    rows = parse_importtime(_run(["-X", "importtime"]).stderr)
+    top = sorted(rows, reverse=True)[:args.top]
+
+    median = statistics.median(samples)
+    report = {
+        "runs": args.runs,
+        "median_seconds": round(median, 4),
+        "min_seconds": round(min(samples), 4),
+        "max_seconds": round(max(samples), 4),
+        "heavy_modules_loaded": sorted(heavy),
+        "top_imports": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in top],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failed = False
+    if heavy:
+        print(f"❌ 导入时加载了重量级依赖: {', '.join(sorted(heavy))}", file=sys.stderr)
+        failed = True
+    if median > args.max_seconds:
+        print(f"❌ 导入耗时 {median:.3f}s 超过上限 {args.max_seconds:.3f}s", file=sys.stderr)
+        failed = True
+    if not failed:
+        print(f"✅ 导入耗时 {median:.3f}s，未加载重量级依赖", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
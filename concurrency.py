@@ -0,0 +1,117 @@
+"""自适应的解码并发控制
+
+批量处理时最合适的并行ffmpeg数量取决于编码格式、分辨率和NAS吞吐，无法事先确定。
+AdaptiveController 在运行中统计每个时间窗口的处理速度（个/秒）和系统I/O等待比例
+（来自 /proc/stat），用爬山法逐步增减同时进行的解码任务数：速度提升就继续同方向调整，
+速度下降就反向；I/O等待很高且速度没有提升时说明存储已饱和，减少并发。
+
+每个任务的ffmpeg线程数取 CPU核数 / 并发数，使总线程数不超过核数。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 速度变化小于该比例时视为没有变化
+RATE_TOLERANCE = 0.05
+# I/O等待比例超过该值时认为存储已成为瓶颈
+IOWAIT_HIGH = 0.3
+
+
+def read_cpu_times():
+    """读取 /proc/stat 的CPU累计时间，返回 (总时间, iowait时间)；不支持的系统返回None"""
+    try:
+        with open("/proc/stat", "r", encoding="ascii") as f:
+            fields = f.readline().split()
+    except OSError:
+        return None
+    if not fields or fields[0] != "cpu":
+        return None
+    values = [int(v) for v in fields[1:]]
+    # user nice system idle iowait irq softirq steal ...（guest已计入user）
+    return sum(values[:8]), values[4] if len(values) > 4 else 0
+
+
+def iowait_fraction(start, end):
+    """两次 read_cpu_times 之间iowait占CPU时间的比例"""
+    if not start or not end or end[0] <= start[0]:
+        return None
+    return (end[1] - start[1]) / (end[0] - start[0])
+
+
+class AdaptiveController:
+    """可动态调整上限的并发控制器
+
+    用法:
+        with controller.slot() as threads:
+            extract_frames(..., threads=threads)
+    """
+
+    def __init__(self, min_jobs=1, max_jobs=None, cpu_count=None, window=3.0, log=print):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.min_jobs = max(1, min_jobs)
+        self.max_jobs = max(self.min_jobs, max_jobs or self.cpu_count)
+        self.window = window
+        self.limit = min(max(self.min_jobs, self.cpu_count // 2), self.max_jobs)
+        self.history = []
+        self._log = log
+        self._cond = threading.Condition()
+        self._active = 0
+        self._direction = 1
+        self._last_rate = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._completed = 0
+        self._window_start = time.monotonic()
+        self._cpu_start = read_cpu_times()
+
+    @property
+    def threads_per_job(self):
+        return max(1, self.cpu_count // self.limit)
+
+    @contextmanager
+    def slot(self):
+        """等待一个空闲名额，产出该任务应使用的解码线程数"""
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+            threads = self.threads_per_job
+        try:
+            yield threads
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._completed += 1
+                self._maybe_adjust()
+                self._cond.notify_all()
+
+    def _maybe_adjust(self):
+        """一个窗口结束时根据速度和I/O等待调整并发数，调用时需持有锁"""
+        elapsed = time.monotonic() - self._window_start
+        # 窗口太短或完成数太少时速度不可靠
+        if elapsed < self.window or self._completed < self.limit:
+            return
+        rate = self._completed / elapsed
+        iowait = iowait_fraction(self._cpu_start, read_cpu_times())
+        last_rate = self._last_rate
+        improved = last_rate is None or rate > last_rate * (1 + RATE_TOLERANCE)
+        worse = last_rate is not None and rate < last_rate * (1 - RATE_TOLERANCE)
+        if worse:
+            self._direction = -self._direction
+        elif not improved and iowait is not None and iowait > IOWAIT_HIGH:
+            self._direction = -1
+
+        old_limit = self.limit
+        self.limit = min(max(self.limit + self._direction, self.min_jobs), self.max_jobs)
+        if self.limit == old_limit:
+            # 已到边界，下个窗口往回试探
+            self._direction = -self._direction
+        self.history.append({"jobs": old_limit, "rate": rate, "iowait": iowait})
+        if self._log and self.limit != old_limit:
+            iowait_text = f"{iowait:.0%}" if iowait is not None else "未知"
+            self._log(f"⚙️ 调整解码并发: {old_limit} → {self.limit}"
+                      f"（{rate:.2f} 个/秒，I/O等待 {iowait_text}，每任务 {self.threads_per_job} 线程）")
+        self._last_rate = rate
+        self._reset_window()
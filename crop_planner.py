@@ -0,0 +1,116 @@
+"""根据画面主体规划裁剪窗口
+
+固定从画面中央截取时，偏离中心的人物会被切掉。这里先在缩小的代理图上找出画面主体：
+优先使用Haar检测到的人脸框，没有人脸时用梯度能量的分布估计一个显著区域；
+再让目标宽高比的窗口尽量包含这些框，并把窗口位置换算回原始分辨率。
+
+规划只产生坐标，裁剪通过数组切片完成（不复制像素），不增加任何解码开销。
+"""
+import numpy as np
+
+from face_detector import detect_faces
+
+# 代理图的目标宽度，人脸检测和显著性估计都在代理图上进行
+PROXY_WIDTH = 640
+
+# 人脸中心在窗口纵向上的位置（从上往下的比例），略高于中心以保留头顶空间
+FACE_ANCHOR_Y = 0.4
+
+
+def _proxy(frame, proxy_width=PROXY_WIDTH):
+    """按步长切片得到代理图，返回 (代理图, 步长)"""
+    step = max(1, frame.shape[1] // proxy_width)
+    return frame[::step, ::step], step
+
+
+def saliency_box(frame):
+    """用梯度能量估计显著区域，返回 (x, y, w, h)；画面没有纹理时返回None"""
+    luma = frame.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    energy = np.abs(np.diff(luma, axis=1))[:-1, :] + np.abs(np.diff(luma, axis=0))[:, :-1]
+    total = energy.sum()
+    if total <= 0:
+        return None
+    ys, xs = np.arange(energy.shape[0]), np.arange(energy.shape[1])
+    col, row = energy.sum(axis=0) / total, energy.sum(axis=1) / total
+    cx, cy = float(col @ xs), float(row @ ys)
+    # 用能量分布的标准差作为显著区域的大小
+    sx = float(np.sqrt(col @ (xs - cx) ** 2))
+    sy = float(np.sqrt(row @ (ys - cy) ** 2))
+    return (int(cx - sx), int(cy - sy), max(1, int(2 * sx)), max(1, int(2 * sy)))
+
+
+def _largest_first(boxes):
+    """按面积从大到小排序，最大的框作为主要主体"""
+    return sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)
+
+
+def find_subjects(frame, faces=None, proxy_width=PROXY_WIDTH):
+    """返回画面主体框列表 [(x, y, w, h), ...]（原始分辨率坐标）和来源（"face"/"saliency"/None）
+
+    faces: 已在同一帧上检测到的人脸框，提供时（包括空列表）不再重复检测人脸。
+    自行检测时保留偏离中心的人脸，这些正是需要按主体放置窗口的情况。
+    """
+    if faces:
+        return _largest_first(faces), "face"
+    proxy, step = _proxy(frame, proxy_width)
+    boxes = detect_faces(proxy, centered_only=False) if faces is None else []
+    source = "face"
+    if not boxes:
+        box = saliency_box(proxy)
+        boxes, source = ([box], "saliency") if box else ([], None)
+    return _largest_first([(x * step, y * step, w * step, h * step) for x, y, w, h in boxes]), source
+
+
+def _place(span_start, span_end, window, limit, anchor):
+    """在 [0, limit) 中放置长度为 window 的窗口，尽量包含 [span_start, span_end)"""
+    if span_end - span_start <= window:
+        start = (span_start + span_end) / 2 - window * anchor
+        # 按锚点放置后仍要完整包含主体
+        start = min(max(start, span_end - window), span_start)
+    else:
+        # 主体比窗口大时以其中心为准
+        start = (span_start + span_end - window) / 2
+    return int(min(max(start, 0), limit - window))
+
+
+def plan_crop(frame_size, ratio, boxes=None):
+    """规划指定宽高比的最大裁剪窗口，返回 (x, y, 宽, 高)
+
+    frame_size: (宽, 高)；ratio: 目标宽高比（宽/高）；
+    boxes: 主体框列表，第一个框为主要主体。没有主体时从中央截取。
+    """
+    width, height = frame_size
+    crop_width, crop_height = int(height * ratio), height
+    if crop_width > width:
+        crop_width, crop_height = width, min(int(width / ratio), height)
+    if not boxes:
+        return (width - crop_width) // 2, (height - crop_height) // 2, crop_width, crop_height
+
+    def span(boxes):
+        return (min(b[0] for b in boxes), max(b[0] + b[2] for b in boxes),
+                min(b[1] for b in boxes), max(b[1] + b[3] for b in boxes))
+
+    left, right, top, bottom = span(boxes)
+    # 所有主体放不进窗口时只保证主要主体
+    if right - left > crop_width or bottom - top > crop_height:
+        left, right, top, bottom = span(boxes[:1])
+    x = _place(left, right, crop_width, width, 0.5)
+    y = _place(top, bottom, crop_height, height, FACE_ANCHOR_Y)
+    return x, y, crop_width, crop_height
+
+
+def apply_crop(frame, window):
+    """按 (x, y, 宽, 高) 切片，返回视图而非副本"""
+    x, y, w, h = window
+    return frame[y:y + h, x:x + w]
+
+
+def cover_size(src_size, target_size):
+    """保持宽高比缩放到恰好覆盖 target_size 的尺寸（之后再裁剪到目标宽高比）"""
+    src_width, src_height = src_size
+    target_width, target_height = target_size
+    scale = max(target_width / src_width, target_height / src_height)
+    # 四舍五入后保证不小于目标尺寸，且为偶数以兼容yuv420缩放
+    width = max(target_width, int(round(src_width * scale / 2)) * 2)
+    height = max(target_height, int(round(src_height * scale / 2)) * 2)
+    return width, height
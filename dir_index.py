@@ -0,0 +1,78 @@
+"""带缓存的目录索引
+
+使用 os.scandir 列出目录，利用 DirEntry 自带的类型信息区分目录和视频文件，
+避免对每个条目单独 stat。每个目录的列表按目录 mtime 缓存，mtime 变化时重新扫描。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+class DirectoryIndex:
+    """按目录缓存子目录和视频文件列表的LRU索引"""
+
+    def __init__(self, exts, max_dirs=1024):
+        self._exts = tuple(ext.lower() for ext in exts)
+        self._max_dirs = max_dirs
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _scan(self, dir_path):
+        dirs = []
+        files = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif entry.is_file() and entry.name.lower().endswith(self._exts):
+                        files.append(entry.name)
+                except OSError:
+                    continue  # 忽略无法访问的条目
+        dirs.sort(key=str.lower)
+        files.sort(key=str.lower)
+        return dirs, files
+
+    def list(self, dir_path):
+        """返回 (子目录名列表, 视频文件名列表)，目录未变化时直接使用缓存"""
+        mtime = os.stat(dir_path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(dir_path)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(dir_path)
+                return cached[1], cached[2]
+
+        dirs, files = self._scan(dir_path)
+        with self._lock:
+            self._cache[dir_path] = (mtime, dirs, files)
+            self._cache.move_to_end(dir_path)
+            while len(self._cache) > self._max_dirs:
+                self._cache.popitem(last=False)
+        return dirs, files
+
+    def page(self, dir_path, offset=0, limit=200):
+        """分页返回目录内容，目录在前、文件在后"""
+        dirs, files = self.list(dir_path)
+        total = len(dirs) + len(files)
+        items = []
+        for i in range(offset, min(offset + limit, total)):
+            if i < len(dirs):
+                items.append({"name": dirs[i], "type": "dir"})
+            else:
+                items.append({"name": files[i - len(dirs)], "type": "file"})
+        return {
+            "items": items,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "total_dirs": len(dirs),
+            "total_files": len(files),
+        }
+
+    def invalidate(self, dir_path=None):
+        """清除指定目录（或全部）的缓存"""
+        with self._lock:
+            if dir_path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(dir_path, None)
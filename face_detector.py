@@ -0,0 +1,88 @@
+"""共享人脸检测引擎
+
+Haar级联分类器的XML解析开销较大，这里为每个线程（进程内的每个工作线程）只加载一次
+人脸和眼睛分类器，之后所有帧都复用同一组对象。
+CascadeClassifier 不能在多个线程间安全共享，所以使用 threading.local 保存。
+"""
+import threading
+
+import cv2
+import numpy as np
+
+FACE_CASCADE_FILE = "haarcascade_frontalface_default.xml"
+EYE_CASCADE_FILE = "haarcascade_eye.xml"
+
+_local = threading.local()
+
+
+def _get_cascades():
+    """获取当前线程的级联分类器，首次调用时加载"""
+    cascades = getattr(_local, "cascades", None)
+    if cascades is None:
+        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + FACE_CASCADE_FILE)
+        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + EYE_CASCADE_FILE)
+        if face_cascade.empty() or eye_cascade.empty():
+            raise RuntimeError(f"无法加载Haar级联分类器: {cv2.data.haarcascades}")
+        cascades = (face_cascade, eye_cascade)
+        _local.cascades = cascades
+    return cascades
+
+
+def warm_up():
+    """预先加载当前线程的分类器，可在工作线程启动时调用"""
+    _get_cascades()
+
+
+def detect_faces(frame, centered_only=True):
+    """检测单帧中的有效人脸，使用多维度验证减少误判
+
+    centered_only 为 True 时只保留中心位于画面中部的人脸（选帧用）；
+    裁剪规划需要偏离中心的人脸，传入 False。
+    返回通过验证的人脸框列表 [(x, y, w, h), ...]，没有人脸时返回空列表。
+    """
+    face_cascade, eye_cascade = _get_cascades()
+    gray = cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2GRAY)
+
+    frame_height, frame_width = gray.shape[:2]
+    min_size = (max(40, frame_width // 10), max(40, frame_height // 10))
+    max_size = (frame_width // 2, frame_height // 2)
+
+    faces = face_cascade.detectMultiScale(
+        gray,
+        scaleFactor=1.3,
+        minNeighbors=12,
+        minSize=min_size,
+        maxSize=max_size
+    )
+
+    valid_faces = []
+    for (x, y, w, h) in faces:
+        aspect_ratio = w / h
+        face_center_x = x + w // 2
+        face_center_y = y + h // 2
+        is_centered = not centered_only or (
+            0.2 * frame_width < face_center_x < 0.8 * frame_width and
+            0.1 * frame_height < face_center_y < 0.8 * frame_height
+        )
+
+        roi_gray = gray[y:y+h, x:x+w]
+        eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
+        has_eyes = len(eyes) >= 1
+
+        if (0.7 < aspect_ratio < 1.3) and is_centered and has_eyes:
+            valid_faces.append((int(x), int(y), int(w), int(h)))
+
+    return valid_faces
+
+
+def detect(frames):
+    """批量检测，frames 可以是帧列表或形如 (N, H, W, 3) 的数组
+
+    返回与输入顺序一致的列表，每项是该帧的有效人脸框列表。
+    """
+    return [detect_faces(frame) for frame in frames]
+
+
+def has_face(frame):
+    """检测帧中是否包含人脸"""
+    return len(detect_faces(frame)) > 0
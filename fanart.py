@@ -1,48 +1,23 @@
 # Updated code: generate fanart.jpg if poster.jpg exists and fanart.jpg is missing
 import os
+import argparse
 import random
 import subprocess
-from contextlib import contextmanager
-from moviepy import VideoFileClip
-from PIL import Image
-import cv2
-import numpy as np
-import tempfile
-import shutil
 from tkinter import Tk, filedialog
+from face_detector import detect
+from frame_extractor import extract_frames
+from frame_quality import best_frame
+from video_walker import walk_videos
+from renditions import Rendition, render, write_output
+from crop_planner import find_subjects, cover_size
+from pipeline import Stage, run_pipeline, parse_stage_workers
+import media_probe
 
 SUPPORTED_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm"]
+CANDIDATE_COUNT = 5
 
 # Existing functions unchanged up to generate_random_thumbnail
 # ... (keep previous functions same: check_ffmpeg, get_video_clip, has_face, generate_random_thumbnail)
-def has_face(frame):
-    gray = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
-    frame_height, frame_width = gray.shape[:2]
-    min_size = (max(40, frame_width // 10), max(40, frame_height // 10))
-    max_size = (frame_width // 2, frame_height // 2)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=12, minSize=min_size, maxSize=max_size)
-    if len(faces) == 0:
-        return False
-    valid_faces = []
-    for (x, y, w, h) in faces:
-        aspect_ratio = w / h
-        face_center_x = x + w // 2
-        face_center_y = y + h // 2
-        is_centered = (
-            0.2 * frame_width < face_center_x < 0.8 * frame_width and
-            0.1 * frame_height < face_center_y < 0.8 * frame_height
-        )
-        face_ratio = (w * h) / (frame_width * frame_height)
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
-        has_eyes = len(eyes) >= 1
-        is_valid = (0.7 < aspect_ratio < 1.3) and is_centered and has_eyes
-        if is_valid:
-            valid_faces.append((x, y, w, h))
-    return len(valid_faces) > 0
-
 def check_ffmpeg():
     try:
         subprocess.run(["ffmpeg", "-version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -50,130 +25,126 @@ def check_ffmpeg():
     except (subprocess.SubprocessError, FileNotFoundError):
         return False
 
+def pick_times(duration):
+    if duration < 0.1:
+        raise ValueError("视频过短")
+    return [random.uniform(duration * 0.1, duration * 0.9) for _ in range(CANDIDATE_COUNT)]
+
+def choose_frame(frames):
+    """排除黑场、白场和过场后优先选有人脸、画面评分最高的候选帧，返回 (索引, 人脸框列表, 评分列表)"""
+    faces = detect(frames)
+    index, scores = best_frame(frames, [bool(boxes) for boxes in faces])
+    return index, faces[index], scores
+
+def decode_size(video_path, size):
+    """保持宽高比、恰好覆盖 size 的解码尺寸，之后再按画面主体裁剪；无法取得源尺寸时直接解码为 size"""
+    if not size:
+        return None
+    try:
+        info = media_probe.probe(video_path)
+    except Exception:
+        return size
+    width, height = info.get("width"), info.get("height")
+    if not width or not height:
+        return size
+    if info.get("rotation") in (90, 270):
+        width, height = height, width
+    return cover_size((width, height), size)
+
+def fanart_rendition(size, quality, output=None):
+    """按目标尺寸的宽高比裁剪，不再把其他比例的画面拉伸到 size"""
+    return Rendition("fanart", output, ratio=size[0] / size[1] if size else None, size=size, quality=quality)
+
+def render_fanart(frame, faces, rendition):
+    """以人脸（没有人脸时为显著区域）定位裁剪窗口并输出"""
+    # 选帧时只检测了居中的人脸，没有时交给规划器在整幅画面中重新查找
+    subjects = find_subjects(frame, faces=faces or None)[0] if rendition.ratio else None
+    return render(frame, rendition, subjects)
+
 def generate_random_thumbnail(video_path, output_path, overwrite=True, quality=100, size=None):
     try:
         if not os.path.exists(video_path):
             return False, f"视频文件不存在: {video_path}"
         try:
-            with get_video_clip(video_path) as clip:
-                duration = clip.duration
-                if duration < 0.1:
-                    return False, "视频过短"
-                frame = None
-                found_face = False
-                face_time = None
-                for _ in range(5):
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    try:
-                        temp_frame = clip.get_frame(t)
-                        if has_face(temp_frame):
-                            frame = temp_frame
-                            found_face = True
-                            face_time = t
-                            break
-                    except Exception:
-                        continue
-                if frame is None:
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    try:
-                        frame = clip.get_frame(t)
-                    except Exception as e:
-                        return False, f"获取视频帧失败: {str(e)}"
-                img = Image.fromarray(frame)
-                if size:
-                    try:
-                        img = img.resize(size, Image.LANCZOS)
-                    except Exception as e:
-                        return False, f"调整图片尺寸失败: {str(e)}"
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                img.save(output_path, "JPEG", quality=quality)
-                result = {
-                    "success": True,
-                    "message": "封面生成成功",
-                    "has_face": found_face,
-                    "timestamp": face_time if found_face else t
-                }
-                return True, result
-        except Exception:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return False, "无法打开视频"
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            duration = frames / fps if fps and fps > 0 and frames and frames > 0 else None
-            frame_rgb = None
-            found_face = False
-            face_time = None
-            t_used = 0
-            for _ in range(5):
-                if duration:
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    idx = int(t * fps)
-                else:
-                    if frames and frames > 0:
-                        idx = int(random.uniform(0.1, 0.9) * frames)
-                        t = idx / fps if fps and fps > 0 else 0
-                    else:
-                        idx = 0
-                        t = 0
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, bgr = cap.read()
-                if not ret:
-                    continue
-                rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-                if has_face(rgb):
-                    frame_rgb = rgb
-                    found_face = True
-                    face_time = t
-                    t_used = t
-                    break
-                else:
-                    frame_rgb = rgb
-                    t_used = t
-            if frame_rgb is None:
-                cap.release()
-                return False, "无法读取视频帧"
-            cap.release()
-            img = Image.fromarray(frame_rgb)
-            if size:
-                try:
-                    img = img.resize(size, Image.LANCZOS)
-                except Exception as e:
-                    return False, f"调整图片尺寸失败: {str(e)}"
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path, "JPEG", quality=quality)
-            result = {
-                "success": True,
-                "message": "封面生成成功",
-                "has_face": found_face,
-                "timestamp": face_time if found_face else t_used
-            }
-            return True, result
+            # 在解码端缩放到覆盖目标尺寸的大小，全尺寸帧不会进入Python
+            extracted = extract_frames(video_path, pick_times, size=decode_size(video_path, size))
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"获取视频帧失败: {str(e)}"
+        index, faces, scores = choose_frame(extracted.frames)
+        found_face = bool(faces)
+        ok, output = render_fanart(extracted.frames[index], faces, fanart_rendition(size, quality, output_path))
+        if not ok:
+            return False, output
+        result = {
+            "success": True,
+            "message": "封面生成成功",
+            "has_face": found_face,
+            "timestamp": extracted.timestamps[index],
+            "backend": extracted.backend,
+            "scores": scores
+        }
+        return True, result
     except Exception as e:
         return False, f"处理视频失败: {str(e)}"
 
-# New function to generate fanart.jpg if poster.jpg exists and fanart.jpg is missing
-def process_fanart(video_path, temp_output, quality=100, size=None):
-    directory = os.path.dirname(video_path)
-    poster_path = os.path.join(directory, "poster.jpg")
-    fanart_path = os.path.join(directory, "fanart.jpg")
+# 流水线各阶段的默认线程数，可用 --stage-workers 覆盖
+DEFAULT_STAGE_WORKERS = {
+    "plan": 2,
+    "probe": 2,
+    "decode": max(1, (os.cpu_count() or 2) // 2),
+    "score": 2,
+    "encode": 2,
+    "write": 4,
+}
 
-    # Only proceed if poster.jpg exists and fanart.jpg does not exist
-    if os.path.exists(poster_path) and not os.path.exists(fanart_path):
-        success, result = generate_random_thumbnail(video_path, temp_output, quality=quality, size=size)
-        if success:
-            try:
-                shutil.copy2(temp_output, fanart_path)
-                result["saved_path"] = fanart_path
-            except Exception as e:
-                result["warning"] = f"封面生成成功但无法保存fanart.jpg: {str(e)}"
-            return True, result
-        else:
-            return False, result
-    else:
-        return None, "poster.jpg不存在或fanart.jpg已存在，跳过"
+def build_fanart_stages(quality=100, size=None, workers=None):
+    """walk之后的各阶段：plan → probe → decode → score → encode → write"""
+    workers = {**DEFAULT_STAGE_WORKERS, **(workers or {})}
+
+    def plan(item):
+        directory = os.path.dirname(item["video"])
+        item["fanart_path"] = os.path.join(directory, "fanart.jpg")
+        # 只在poster.jpg存在且fanart.jpg不存在时生成
+        if not os.path.exists(os.path.join(directory, "poster.jpg")) or os.path.exists(item["fanart_path"]):
+            item["skipped"] = "poster.jpg不存在或fanart.jpg已存在，跳过"
+            item["done"] = True
+        return item
+
+    def probe(item):
+        try:
+            media_probe.probe(item["video"])
+        except Exception:
+            pass  # 由解码阶段的后端自行处理
+        return item
+
+    def decode(item):
+        item["extracted"] = extract_frames(item["video"], pick_times, size=decode_size(item["video"], size))
+        return item
+
+    def score(item):
+        item["index"], item["faces"], item["scores"] = choose_frame(item["extracted"].frames)
+        item["has_face"] = bool(item["faces"])
+        return item
+
+    def encode(item):
+        extracted = item.pop("extracted")
+        ok, output = render_fanart(extracted.frames[item["index"]], item.pop("faces"), fanart_rendition(size, quality))
+        if not ok:
+            raise RuntimeError(output)
+        item["data"] = output["data"]
+        item["timestamp"] = extracted.timestamps[item["index"]]
+        return item
+
+    def write(item):
+        write_output(item["fanart_path"], item.pop("data"))
+        item["saved_path"] = item["fanart_path"]
+        return item
+
+    funcs = [("plan", plan), ("probe", probe), ("decode", decode), ("score", score), ("encode", encode), ("write", write)]
+    return [Stage(name, func, workers=workers[name]) for name, func in funcs]
 
-# Modify main to use process_fanart logic
 def choose_folder():
     root = Tk()
     root.withdraw()
@@ -182,7 +153,22 @@ def choose_folder():
     root.destroy()
     return path
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="根据poster.jpg生成fanart.jpg")
+    parser.add_argument("--stage-workers", default="",
+                        help="流水线各阶段的线程数，例如 decode=4,write=8")
+    args = parser.parse_args(argv)
+    try:
+        args.stage_workers = parse_stage_workers(args.stage_workers)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = set(args.stage_workers) - set(DEFAULT_STAGE_WORKERS)
+    if unknown:
+        parser.error(f"未知的流水线阶段: {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🎬 视频封面生成工具（根据poster.jpg生成fanart.jpg）")
     if not check_ffmpeg():
         print("❌ 警告: 未找到ffmpeg，这是视频处理的必要依赖。")
@@ -192,37 +178,20 @@ def main():
         return
     quality = 100
     size = (1920, 1080)  # 横屏尺寸
-    temp_dir = os.path.join(tempfile.gettempdir(), "thumbnails")
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_output = os.path.join(temp_dir, "temp_thumbnail.jpg")
-
-    def collect_videos(root_dir, max_depth=2):
-        result = []
-        def walk(dir_path, depth):
-            try:
-                for name in os.listdir(dir_path):
-                    p = os.path.join(dir_path, name)
-                    if os.path.isfile(p) and any(name.lower().endswith(ext) for ext in SUPPORTED_EXTS):
-                        result.append(p)
-                    elif os.path.isdir(p) and depth < max_depth:
-                        walk(p, depth + 1)
-            except Exception:
-                pass
-        walk(root_dir, 0)
-        return result
-
-    videos = collect_videos(folder_path, max_depth=2)
-    if not videos:
-        print("⚠️ 选中文件夹下未发现支持的视频文件")
-        return
 
-    print(f"⏳ 共找到 {len(videos)} 个视频，开始检查poster.jpg并生成fanart.jpg...")
-    for video_path in videos:
+    # 边遍历目录边处理：查找、探测、解码、检测、编码和写入在流水线中重叠进行
+    print("⏳ 开始查找视频，检查poster.jpg并生成fanart.jpg...")
+    found = 0
+    videos = ({"video": v} for v in walk_videos(folder_path, max_depth=2, exts=SUPPORTED_EXTS))
+    for item in run_pipeline(videos, build_fanart_stages(quality, size, args.stage_workers)):
+        found += 1
+        video_path = item["video"]
         print(f"🎞️ 检查: {os.path.basename(video_path)}")
-        success, result = process_fanart(video_path, temp_output, quality=quality, size=size)
+        success = None if item.get("skipped") else not item.get("error")
+        result = item.get("skipped") or item.get("error") or item
         if success:
             msg = "✅ fanart.jpg生成成功！"
-            msg += " 检测到人脸" if result.get("has_face") else " 使用随机帧"
+            msg += " 检测到人脸" if result.get("has_face") else " 按画面评分选帧"
             ts = result.get("timestamp")
             if isinstance(ts, (int, float)):
                 msg += f" 时间点: {ts:.2f}s"
@@ -235,6 +204,10 @@ def main():
             print(f"⏭️ 跳过: {result}")
         else:
             print(f"❌ {os.path.basename(video_path)} fanart生成失败: {result}")
+    if not found:
+        print("⚠️ 选中文件夹下未发现支持的视频文件")
+    else:
+        print(f"📊 共检查 {found} 个视频")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,512 @@
+"""视频帧提取
+
+提供三种可互换的解码后端（moviepy、OpenCV VideoCapture、ffmpeg管道），
+并由 FrameExtractor 按文件类型记录各后端的实测耗时，自动选择最快且可用的后端。
+
+ffmpeg后端在一次调用内取出所有候选时间点的帧：每个时间点作为一个带 -ss 的输入（只需从
+最近的关键帧解码到目标帧），各取一帧后用 concat 拼成一个流，从stdout输出：帧尺寸已知时
+输出rawvideo并直接读入预先分配的NumPy数组，否则输出PPM并解析尺寸。
+这样每个视频只启动一个解码会话，而不是每个候选帧各做一次完整的seek。
+
+指定输出尺寸 size 时在解码端缩放（ffmpeg的scale滤镜、moviepy读取器的目标分辨率），
+4K/8K源的全尺寸帧不会进入Python；OpenCV后端无法在解码时缩放，读出每帧后立即缩小，
+只保留缩小后的帧。
+"""
+import atexit
+import collections
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import media_probe
+
+FFMPEG_BIN = "ffmpeg"
+
+# 保留的ffmpeg错误输出行数
+STDERR_TAIL_LINES = 20
+
+# 关键帧模式下 -ss 比关键帧时间稍晚一点，避免时间点被舍入到关键帧之前而落到上一个关键帧
+KEYFRAME_SEEK_EPSILON = 0.0005
+
+# 后端耗时统计的默认保存位置
+DEFAULT_STATS_PATH = os.path.join(tempfile.gettempdir(), "thumbnails", "backend_timings.json")
+
+
+def _build_sample_cmd(video_path, timestamps, raw=False, keyframes_only=False, threads=None, size=None):
+    cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostdin"]
+    for t in timestamps:
+        if threads:
+            # 限制每个输入的解码线程数，由调度方根据并发数分配CPU
+            cmd += ["-threads", str(threads)]
+        if keyframes_only:
+            # 只解码关键帧，并直接输出seek落到的关键帧而不是继续解码到精确时间点
+            cmd += ["-skip_frame", "nokey", "-noaccurate_seek"]
+            t += KEYFRAME_SEEK_EPSILON
+        cmd += ["-ss", f"{t:.6f}", "-i", video_path]
+    # 每个输入只取一帧后再缩放，只有被选中的帧参与缩放
+    scale = f",scale={size[0]}:{size[1]}:flags=lanczos" if size else ""
+    chains = [
+        f"[{i}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS{scale}[v{i}]"
+        for i in range(len(timestamps))
+    ]
+    inputs = "".join(f"[v{i}]" for i in range(len(timestamps)))
+    chains.append(f"{inputs}concat=n={len(timestamps)}:v=1:a=0[out]")
+    cmd += [
+        "-filter_complex", ";".join(chains),
+        "-map", "[out]", "-fps_mode", "passthrough",
+    ]
+    if raw:
+        # 帧尺寸已知时直接输出裸RGB数据，无需逐帧解析头部
+        cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    else:
+        cmd += ["-f", "image2pipe", "-c:v", "ppm", "pipe:1"]
+    return cmd
+
+
+def _parse_ppm_stream(data):
+    """解析连续的P6格式PPM数据，返回帧列表（均为data上的只读视图，不复制）"""
+    frames = []
+    buf = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        fields = []
+        while len(fields) < 4:
+            # 跳过空白，读取下一个头部字段
+            while data[pos:pos + 1].isspace():
+                pos += 1
+            end = pos
+            while end < len(data) and not data[end:end + 1].isspace():
+                end += 1
+            fields.append(data[pos:end])
+            pos = end
+        pos += 1  # 头部结束后的单个空白字符
+        magic, width, height, maxval = fields
+        if magic != b"P6" or int(maxval) != 255:
+            raise ValueError("无法解析ffmpeg输出的PPM帧")
+        width, height = int(width), int(height)
+        size = width * height * 3
+        frame = np.frombuffer(buf[pos:pos + size], dtype=np.uint8)
+        frames.append(frame.reshape(height, width, 3))
+        pos += size
+    return frames
+
+
+def _drain_stderr(pipe, tail):
+    """持续读取ffmpeg的错误输出，只保留最后几行，避免管道写满后ffmpeg阻塞"""
+    for line in pipe:
+        tail.append(line)
+
+
+def _read_raw_frames(cmd, count, frame_size, timeout=None):
+    """运行ffmpeg并把rawvideo输出直接读入预先分配的 (N, H, W, 3) 数组，不产生中间副本"""
+    width, height = frame_size
+    frames = np.empty((count, height, width, 3), dtype=np.uint8)
+    target = memoryview(frames).cast("B")
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"ffmpeg提取帧失败: {e}")
+    tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    stderr_thread = threading.Thread(target=_drain_stderr, args=(proc.stderr, tail), daemon=True)
+    stderr_thread.start()
+    timer = threading.Timer(timeout, proc.kill) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        filled = 0
+        while filled < len(target):
+            n = proc.stdout.readinto(target[filled:])
+            if not n:
+                break
+            filled += n
+        # 多余的输出说明实际帧尺寸与预期不符，此时不再读取剩余数据
+        extra = proc.stdout.read(1)
+        if extra:
+            proc.kill()
+        returncode = proc.wait()
+        stderr_thread.join()
+        stderr = b"".join(tail)
+    finally:
+        if timer:
+            timer.cancel()
+        proc.stdout.close()
+        proc.stderr.close()
+    if returncode != 0 and not extra:
+        raise RuntimeError(f"ffmpeg提取帧失败: {stderr.decode(errors='replace').strip()}")
+    if filled != len(target) or extra:
+        raise RuntimeError(f"ffmpeg输出的数据量与 {count} 帧 {width}x{height} 不符")
+    return frames
+
+
+def sample_frames(video_path, timestamps, timeout=None, frame_size=None, keyframes_only=False, threads=None,
+                  size=None):
+    """在一次有序解码会话中提取多个时间点的帧
+
+    timestamps 会按时间顺序排序后再提取。
+    frame_size 为 (宽, 高) 时以rawvideo格式直接读入NumPy数组，否则输出PPM并解析尺寸。
+    keyframes_only 为 True 时只解码关键帧，timestamps 应已对齐到关键帧时间。
+    threads 指定ffmpeg的解码线程数，None 时由ffmpeg自行决定。
+    size 为 (宽, 高) 时由ffmpeg在解码端缩放到该尺寸（此时无需 frame_size）。
+    返回 (排序后的时间点列表, 形如 (N, H, W, 3) 的RGB uint8数组)。
+    提取失败或帧数不符时抛出 RuntimeError，调用方可退回逐帧读取。
+    """
+    timestamps = sorted(float(t) for t in timestamps)
+    if not timestamps:
+        raise ValueError("未指定候选时间点")
+
+    if size:
+        frame_size = tuple(size)
+    if frame_size:
+        cmd = _build_sample_cmd(video_path, timestamps, raw=True, keyframes_only=keyframes_only,
+                                threads=threads, size=size)
+        return timestamps, _read_raw_frames(cmd, len(timestamps), frame_size, timeout=timeout)
+
+    cmd = _build_sample_cmd(video_path, timestamps, keyframes_only=keyframes_only, threads=threads)
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except (subprocess.SubprocessError, FileNotFoundError) as e:
+        raise RuntimeError(f"ffmpeg提取帧失败: {e}")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg提取帧失败: {proc.stderr.decode(errors='replace').strip()}")
+
+    frames = _parse_ppm_stream(proc.stdout)
+    if len(frames) != len(timestamps):
+        raise RuntimeError(f"ffmpeg只返回了 {len(frames)}/{len(timestamps)} 帧")
+    return timestamps, np.stack(frames)
+
+
+def sample_clip_frames(clip, timestamps):
+    """使用已打开的moviepy剪辑按时间顺序逐帧读取，作为ffmpeg提取失败时的回退
+
+    按时间排序后读取可以让moviepy的读取器尽量向前解码而不是反复回退。
+    读取失败的时间点会被跳过，返回 (成功的时间点列表, 帧数组)。
+    """
+    used, frames = [], []
+    for t in sorted(timestamps):
+        try:
+            frames.append(clip.get_frame(t))
+            used.append(t)
+        except Exception:
+            continue
+    if not frames:
+        raise RuntimeError("无法读取任何候选帧")
+    return used, np.stack(frames)
+
+
+class VideoSource:
+    """已打开的视频，提供时长、帧率和按时间点批量读取帧的能力
+
+    构造时可指定 size=(宽, 高)，读出的帧缩放到该尺寸。
+    """
+
+    duration = None
+    fps = None
+
+    def read_frames(self, timestamps, keyframes_only=False, threads=None):
+        """按时间顺序读取帧，返回 (时间点列表, 形如 (N, H, W, 3) 的RGB数组)
+
+        keyframes_only 表示时间点均已对齐到关键帧，后端可据此跳过非关键帧的解码。
+        threads 为建议的解码线程数，不支持的后端可忽略。
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MoviepySource(VideoSource):
+    def __init__(self, video_path, size=None):
+        from moviepy import VideoFileClip
+        if size:
+            # 由moviepy启动的ffmpeg读取器直接输出目标尺寸
+            self.clip = VideoFileClip(video_path, target_resolution=tuple(size), resize_algorithm="lanczos")
+        else:
+            self.clip = VideoFileClip(video_path)
+        self.duration = self.clip.duration
+        self.fps = self.clip.fps
+
+    def read_frames(self, timestamps, keyframes_only=False, threads=None):
+        return sample_clip_frames(self.clip, timestamps)
+
+    def close(self):
+        try:
+            self.clip.close()
+        except Exception as e:
+            print(f"⚠️ 关闭视频时发生错误: {e}")
+
+
+class OpenCVSource(VideoSource):
+    """OpenCV VideoCapture 后端
+
+    候选时间点排序后向前读取：与下一个目标相差不超过 GRAB_MAX_SECONDS 时用 grab() 逐帧跳过
+    （只解码不转换），更远或需要后退时才按时间戳seek。AVI、FLV、WMV等容器的seek很慢甚至
+    需要从头线性扫描，相近的候选帧之间不再反复seek。
+    """
+
+    GRAB_MAX_SECONDS = 2.0
+
+    def __init__(self, video_path, size=None):
+        import cv2
+        self._cv2 = cv2
+        self.size = tuple(size) if size else None
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise RuntimeError("无法打开视频")
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        frames = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        self.fps = fps if fps and fps > 0 else None
+        self.frame_count = int(frames) if frames and frames > 0 else None
+        if self.fps and self.frame_count:
+            self.duration = self.frame_count / self.fps
+
+    def read_frames(self, timestamps, keyframes_only=False, threads=None):
+        cv2 = self._cv2
+        used, frames = [], []
+        grab_limit = int(self.fps * self.GRAB_MAX_SECONDS) if self.fps else 0
+        # 下一次 read() 将返回的帧序号，读取失败后为None，下一个目标必须seek
+        pos = 0
+        for t in sorted(timestamps):
+            if not self.fps:
+                # 帧率未知时无法换算帧序号，每个目标都按时间戳seek
+                self.cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
+            else:
+                idx = int(t * self.fps)
+                gap = idx - pos if pos is not None else -1
+                if 0 <= gap <= grab_limit:
+                    for _ in range(gap):
+                        if not self.cap.grab():
+                            break
+                else:
+                    # 按目标帧的时间戳seek，与逐帧跳过取到的是同一帧
+                    self.cap.set(cv2.CAP_PROP_POS_MSEC, idx / self.fps * 1000)
+            ret, bgr = self.cap.read()
+            if not ret:
+                pos = None
+                continue
+            pos = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if self.size:
+                # 先缩小再转换颜色，全尺寸帧读出后立即释放
+                shrink = self.size[0] < bgr.shape[1]
+                bgr = cv2.resize(bgr, self.size, interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LANCZOS4)
+            frames.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            used.append(t)
+        if not frames:
+            raise RuntimeError("无法读取视频帧")
+        return used, np.stack(frames)
+
+    def close(self):
+        self.cap.release()
+
+
+class FFmpegSource(VideoSource):
+    def __init__(self, video_path, size=None):
+        self.video_path = video_path
+        self.size = tuple(size) if size else None
+        # 元数据来自带缓存的探测，同一文件不会重复读取文件头
+        self.info = media_probe.probe(video_path)
+        self.duration = self.info["duration"]
+        self.fps = self.info["fps"]
+        width, height = self.info.get("width"), self.info.get("height")
+        if width and height and self.info.get("rotation") in (90, 270):
+            # ffmpeg解码时会自动旋转画面
+            width, height = height, width
+        self.frame_size = (width, height) if width and height else None
+
+    def read_frames(self, timestamps, keyframes_only=False, threads=None):
+        return sample_frames(self.video_path, timestamps, frame_size=self.frame_size,
+                             keyframes_only=keyframes_only, threads=threads, size=self.size)
+
+
+class FrameBackend:
+    """一种解码方式，open() 返回 VideoSource"""
+
+    def __init__(self, name, source_cls):
+        self.name = name
+        self._source_cls = source_cls
+
+    def open(self, video_path, size=None):
+        return self._source_cls(video_path, size=size)
+
+
+BACKENDS = [
+    FrameBackend("ffmpeg", FFmpegSource),
+    FrameBackend("opencv", OpenCVSource),
+    FrameBackend("moviepy", MoviepySource),
+]
+
+
+class ExtractResult:
+    """提取结果；open_seconds 为打开视频（含读取元数据）的耗时，read_seconds 为seek加解码的耗时"""
+
+    def __init__(self, duration, fps, timestamps, frames, backend, open_seconds=None, read_seconds=None):
+        self.duration = duration
+        self.fps = fps
+        self.timestamps = timestamps
+        self.frames = frames
+        self.backend = backend
+        self.open_seconds = open_seconds
+        self.read_seconds = read_seconds
+
+
+class FrameExtractor:
+    """按文件扩展名选择解码后端
+
+    每次提取后记录该后端每帧的平均耗时（指数滑动平均）和失败次数，并持久化到JSON文件，
+    下次运行时直接沿用。尚未测量够 MIN_SAMPLES 次的后端会被优先尝试，
+    之后总是先用最快的后端，并每隔 EXPLORE_EVERY 次重新测量一次其他后端。
+    某个后端失败时自动换下一个。
+    """
+
+    MIN_SAMPLES = 3
+    EXPLORE_EVERY = 50
+    EWMA_ALPHA = 0.3
+    SAVE_INTERVAL = 5.0
+
+    def __init__(self, stats_path=DEFAULT_STATS_PATH, backends=None):
+        self.stats_path = stats_path
+        self.backends = backends or BACKENDS
+        self._lock = threading.Lock()
+        self._stats = self._load_stats()
+        self._calls = {}
+        self._last_save = 0.0
+
+    def _load_stats(self):
+        if not self.stats_path:
+            return {}
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_stats(self, force=False):
+        """原子写入统计文件，限制写入频率；调用时需持有锁"""
+        now = time.monotonic()
+        if not self.stats_path or (not force and now - self._last_save < self.SAVE_INTERVAL):
+            return
+        self._last_save = now
+        try:
+            os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+            tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._stats, f, indent=2)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            print(f"⚠️ 保存解码后端统计失败: {e}")
+
+    def flush(self):
+        with self._lock:
+            self._save_stats(force=True)
+
+    def _record(self, ext, name, seconds_per_frame):
+        with self._lock:
+            entry = self._stats.setdefault(ext, {}).setdefault(name, {"count": 0, "failures": 0, "avg": None})
+            if seconds_per_frame is None:
+                entry["failures"] += 1
+            else:
+                entry["count"] += 1
+                if entry["avg"] is None:
+                    entry["avg"] = seconds_per_frame
+                else:
+                    entry["avg"] += self.EWMA_ALPHA * (seconds_per_frame - entry["avg"])
+            self._save_stats()
+
+    def order_for(self, video_path):
+        """返回该文件类型应尝试的后端顺序"""
+        ext = os.path.splitext(video_path)[1].lower()
+        with self._lock:
+            stats = self._stats.get(ext, {})
+            calls = self._calls[ext] = self._calls.get(ext, 0) + 1
+
+        def sample_count(backend):
+            entry = stats.get(backend.name, {})
+            return entry.get("count", 0) + entry.get("failures", 0)
+
+        def rank(backend):
+            entry = stats.get(backend.name, {})
+            count, failures = entry.get("count", 0), entry.get("failures", 0)
+            # 失败多于成功的后端排到最后
+            unreliable = failures > count
+            return (unreliable, entry.get("avg") or float("inf"))
+
+        untried = [b for b in self.backends if sample_count(b) < self.MIN_SAMPLES]
+        measured = sorted((b for b in self.backends if b not in untried), key=rank)
+        if measured and calls % self.EXPLORE_EVERY == 0 and len(measured) > 1:
+            # 定期重新测量一个非最快的后端，适应环境变化
+            other = random.choice(measured[1:])
+            measured.remove(other)
+            measured.insert(0, other)
+        return untried + measured
+
+    def extract(self, video_path, pick_times, keyframes_only=False, threads=None, size=None):
+        """打开视频并读取 pick_times(duration) 返回的时间点的帧
+
+        keyframes_only 为 True 时把时间点对齐到最近的关键帧（关键帧索引有缓存），
+        只解码关键帧；无法取得关键帧索引时按普通模式提取。
+        threads 为每个解码任务的线程数（目前只有ffmpeg后端使用）。
+        size 为 (宽, 高) 时返回缩放到该尺寸的帧，尽量在解码端完成缩放。
+        pick_times 抛出的异常（例如视频过短时的 ValueError）会直接向上传递；
+        解码失败时依次尝试其他后端，全部失败时抛出 RuntimeError。
+        """
+        ext = os.path.splitext(video_path)[1].lower()
+        errors = []
+        keyframes = None
+        if keyframes_only:
+            try:
+                keyframes = media_probe.keyframes(video_path)
+            except Exception as e:
+                print(f"⚠️ 无法读取关键帧索引，改用普通模式: {e}")
+            keyframes_only = bool(keyframes)
+
+        def fail(backend, error):
+            self._record(ext, backend.name, None)
+            errors.append(f"{backend.name}: {error}")
+
+        for backend in self.order_for(video_path):
+            start = time.perf_counter()
+            try:
+                source = backend.open(video_path, size=size)
+            except Exception as e:
+                fail(backend, e)
+                continue
+            opened = time.perf_counter()
+            try:
+                if not source.duration:
+                    fail(backend, "无法获取视频时长")
+                    continue
+                timestamps = pick_times(source.duration)
+                if keyframes_only:
+                    timestamps = media_probe.snap_to_keyframes(timestamps, keyframes)
+                read_start = time.perf_counter()
+                try:
+                    times, frames = source.read_frames(timestamps, keyframes_only=keyframes_only, threads=threads)
+                except Exception as e:
+                    fail(backend, e)
+                    continue
+            finally:
+                source.close()
+            end = time.perf_counter()
+            self._record(ext, backend.name, (end - start) / len(frames))
+            return ExtractResult(
+                source.duration, source.fps, times, frames, backend.name,
+                open_seconds=opened - start, read_seconds=end - read_start
+            )
+        raise RuntimeError("所有解码后端均失败: " + "; ".join(errors))
+
+
+# 各脚本共用的默认提取器，退出时保存未写入的统计
+default_extractor = FrameExtractor()
+atexit.register(default_extractor.flush)
+
+
+def extract_frames(video_path, pick_times, keyframes_only=False, threads=None, size=None):
+    """使用默认提取器读取帧，见 FrameExtractor.extract"""
+    return default_extractor.extract(video_path, pick_times, keyframes_only=keyframes_only, threads=threads,
+                                     size=size)
@@ -0,0 +1,130 @@
+"""候选帧的画面质量评分
+
+对同一视频的全部候选帧一次性计算几项廉价指标，挑出最适合做封面的一帧：
+
+- 平均亮度：过暗（黑场）或过亮（白场）的帧直接排除；
+- 对比度（亮度标准差）：淡入淡出、纯色过场的对比度很低；
+- 清晰度（拉普拉斯响应的方差）：运动模糊、失焦的帧较低；
+- 色彩熵（量化颜色直方图的熵）：画面内容越丰富越高。
+
+所有指标都在缩小的代理图上计算：对提取器返回的 (N, H, W, 3) 候选帧数组按步长切片取像素
+（不复制、不插值），全部候选帧用NumPy一次算完，不逐帧循环。
+"""
+import numpy as np
+
+# 代理图的目标宽度
+PROXY_WIDTH = 160
+
+# 排除阈值（0-255亮度）
+MIN_LUMINANCE = 16
+MAX_LUMINANCE = 240
+MIN_CONTRAST = 10
+
+# 颜色直方图每个通道的量化位数，共 2^(3*位数) 个颜色
+COLOR_BITS = 3
+COLOR_BINS = 1 << (3 * COLOR_BITS)
+
+# 综合得分中各指标的权重
+WEIGHTS = {"exposure": 0.2, "contrast": 0.25, "sharpness": 0.35, "entropy": 0.2}
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def make_proxy(frames):
+    """把 (N, H, W, 3) 数组或同尺寸帧列表缩小为 (N, h, w, 3) 的uint8数组"""
+    if not isinstance(frames, np.ndarray):
+        frames = np.stack(frames)
+    step = max(1, frames.shape[2] // PROXY_WIDTH)
+    return frames[:, ::step, ::step]
+
+
+def compute_metrics(proxy):
+    """对 (N, h, w, 3) 的代理图批量计算各项指标，返回 {指标名: 长度为N的数组}"""
+    count = proxy.shape[0]
+    luma = proxy.astype(np.float32) @ _LUMA
+
+    luminance = luma.mean(axis=(1, 2))
+    contrast = luma.std(axis=(1, 2))
+
+    # 4邻域拉普拉斯算子，用错位切片代替卷积
+    laplacian = (luma[:, :-2, 1:-1] + luma[:, 2:, 1:-1] + luma[:, 1:-1, :-2] + luma[:, 1:-1, 2:]
+                 - 4 * luma[:, 1:-1, 1:-1])
+    sharpness = laplacian.var(axis=(1, 2))
+
+    # 量化颜色后给每帧加上偏移，一次 bincount 得到所有帧的直方图
+    shift = 8 - COLOR_BITS
+    q = proxy >> shift
+    codes = ((q[..., 0].astype(np.int64) << (2 * COLOR_BITS)) | (q[..., 1].astype(np.int64) << COLOR_BITS)
+             | q[..., 2]).reshape(count, -1)
+    codes += np.arange(count, dtype=np.int64)[:, None] * COLOR_BINS
+    hist = np.bincount(codes.ravel(), minlength=count * COLOR_BINS).reshape(count, COLOR_BINS)
+    p = hist / hist.sum(axis=1, keepdims=True)
+    entropy = 0.0 - (p * np.log2(np.where(p > 0, p, 1))).sum(axis=1)
+
+    return {
+        "luminance": luminance,
+        "contrast": contrast,
+        "sharpness": sharpness,
+        "entropy": entropy,
+    }
+
+
+def score_metrics(metrics):
+    """根据指标计算 (综合得分数组, 排除原因列表)，未被排除的原因为None"""
+    luminance = metrics["luminance"]
+    exposure = 1 - np.abs(luminance - 128) / 128
+    contrast = np.minimum(metrics["contrast"] / 64, 1)
+    sharpness = np.minimum(np.log1p(metrics["sharpness"]) / np.log1p(1000), 1)
+    entropy = metrics["entropy"] / (3 * COLOR_BITS)
+    score = (WEIGHTS["exposure"] * exposure + WEIGHTS["contrast"] * contrast
+             + WEIGHTS["sharpness"] * sharpness + WEIGHTS["entropy"] * entropy)
+
+    reasons = []
+    for lum, std in zip(luminance, metrics["contrast"]):
+        if lum < MIN_LUMINANCE:
+            reasons.append("black")
+        elif lum > MAX_LUMINANCE:
+            reasons.append("white")
+        elif std < MIN_CONTRAST:
+            reasons.append("flat")
+        else:
+            reasons.append(None)
+    return score, reasons
+
+
+def score_frames(frames):
+    """为每个候选帧评分，返回字典列表（数值均为普通float，可直接序列化为JSON）"""
+    if len(frames) == 0:
+        return []
+    metrics = compute_metrics(make_proxy(frames))
+    score, reasons = score_metrics(metrics)
+    return [
+        {
+            "luminance": round(float(metrics["luminance"][i]), 2),
+            "contrast": round(float(metrics["contrast"][i]), 2),
+            "sharpness": round(float(metrics["sharpness"][i]), 2),
+            "entropy": round(float(metrics["entropy"][i]), 3),
+            "score": round(float(score[i]), 4),
+            "rejected": reasons[i],
+        }
+        for i in range(len(frames))
+    ]
+
+
+def best_frame(frames, faces=None):
+    """一次评分并选出最佳帧，返回 (帧索引, 评分列表)
+
+    faces: 可选的布尔列表，标记各帧是否检测到人脸。未被排除的帧优先，其次是有人脸的帧，
+    最后比较综合得分；全部被排除时仍返回得分最高的一帧。
+    """
+    scores = score_frames(frames)
+    if not scores:
+        return None, scores
+    if faces is not None:
+        for entry, has_face in zip(scores, faces):
+            entry["has_face"] = bool(has_face)
+    best = max(
+        range(len(scores)),
+        key=lambda i: (scores[i]["rejected"] is None, bool(faces and faces[i]), scores[i]["score"])
+    )
+    return best, scores
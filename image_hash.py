@@ -0,0 +1,122 @@
+"""图片感知哈希与持久化哈希索引
+
+dHash 与 pHash 都在缩小后的灰度图上用NumPy整体计算（无逐像素的Python循环）。
+JPEG 借助 PIL 的 draft 模式在解码时直接缩小，读取很快。两张图片的两种哈希的
+汉明距离都不超过阈值时视为近似重复。
+
+HashIndex 把哈希按 (路径, 文件大小, 修改时间) 保存在SQLite中，未变化的图片不会被重新打开。
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image
+
+from sqlite_util import connect
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "thumbnails", "image_hashes.db")
+
+# 两种哈希的汉明距离都不超过该值时视为近似重复（共64位）
+DUPLICATE_THRESHOLD = 8
+
+_HASH_SIZE = 8
+_PHASH_SIZE = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    dhash TEXT NOT NULL,
+    phash TEXT NOT NULL
+)
+"""
+
+
+def _dct_matrix(n):
+    """n点DCT-II的正交变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_PHASH_SIZE)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _gray(img, size):
+    """缩小为指定尺寸的灰度数组"""
+    return np.asarray(img.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def dhash(img):
+    """差值哈希：比较相邻像素的亮度，返回64位整数"""
+    pixels = _gray(img, (_HASH_SIZE + 1, _HASH_SIZE))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(img):
+    """DCT哈希：取低频8x8系数（不含直流分量）与中位数比较，返回64位整数"""
+    pixels = _gray(img, (_PHASH_SIZE, _PHASH_SIZE))
+    coeffs = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    return _bits_to_int(coeffs > np.median(coeffs[1:]))
+
+
+def open_small(path):
+    """打开图片，JPEG在解码时直接缩小到不小于哈希所需的尺寸"""
+    img = Image.open(path)
+    img.draft("L", (_PHASH_SIZE * 2, _PHASH_SIZE * 2))
+    return img
+
+
+def image_hashes(path):
+    """返回图片的 (dhash, phash)"""
+    with open_small(path) as img:
+        return dhash(img), phash(img)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """按文件标识缓存图片哈希的SQLite索引"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with connect(self._db_path) as conn:
+            conn.execute(_SCHEMA)
+
+    def hashes(self, path):
+        """返回 (dhash, phash)，图片未变化时直接读取索引"""
+        st = os.stat(path)
+        with self._lock, connect(self._db_path) as conn:
+            row = conn.execute(
+                "SELECT dhash, phash FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row is not None:
+            return int(row[0], 16), int(row[1], 16)
+
+        result = image_hashes(path)
+        with self._lock, connect(self._db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, dhash, phash) VALUES (?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, f"{result[0]:016x}", f"{result[1]:016x}")
+            )
+        return result
+
+    def near_duplicate(self, path1, path2, threshold=DUPLICATE_THRESHOLD):
+        """两张图片是否近似重复，返回 (是否重复, dhash距离, phash距离)"""
+        hashes1 = self.hashes(path1)
+        hashes2 = self.hashes(path2)
+        distances = [hamming(a, b) for a, b in zip(hashes1, hashes2)]
+        return all(d <= threshold for d in distances), distances[0], distances[1]
@@ -1,16 +1,17 @@
 import os
 import random
 import subprocess
-from contextlib import contextmanager
-from moviepy import VideoFileClip
 from PIL import Image
-import cv2
-import numpy as np
 import tempfile
 import shutil
 from tkinter import Tk, filedialog
+from face_detector import detect
+from frame_extractor import extract_frames
+from frame_quality import best_frame
+from video_walker import walk_videos
 
 SUPPORTED_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm"]
+CANDIDATE_COUNT = 5
 
 def check_ffmpeg():
     try:
@@ -19,146 +20,37 @@ def check_ffmpeg():
     except (subprocess.SubprocessError, FileNotFoundError):
         return False
 
-@contextmanager
-def get_video_clip(video_path):
-    clip = None
-    try:
-        clip = VideoFileClip(video_path)
-        yield clip
-    finally:
-        if clip is not None:
-            try:
-                clip.close()
-            except Exception as e:
-                print(f"关闭视频时发生错误: {e}")
-
-def has_face(frame):
-    gray = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
-    frame_height, frame_width = gray.shape[:2]
-    min_size = (max(40, frame_width // 10), max(40, frame_height // 10))
-    max_size = (frame_width // 2, frame_height // 2)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=12, minSize=min_size, maxSize=max_size)
-    if len(faces) == 0:
-        return False
-    valid_faces = []
-    for (x, y, w, h) in faces:
-        aspect_ratio = w / h
-        face_center_x = x + w // 2
-        face_center_y = y + h // 2
-        is_centered = (
-            0.2 * frame_width < face_center_x < 0.8 * frame_width and
-            0.1 * frame_height < face_center_y < 0.8 * frame_height
-        )
-        face_ratio = (w * h) / (frame_width * frame_height)
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=5)
-        has_eyes = len(eyes) >= 1
-        is_valid = (0.7 < aspect_ratio < 1.3) and is_centered and has_eyes
-        if is_valid:
-            valid_faces.append((x, y, w, h))
-    return len(valid_faces) > 0
-
 def generate_random_thumbnail(video_path, output_path, overwrite=True, quality=100, size=None):
     try:
         if not os.path.exists(video_path):
             return False, f"视频文件不存在: {video_path}"
+        def pick_times(duration):
+            if duration < 0.1:
+                raise ValueError("视频过短")
+            return [random.uniform(duration * 0.1, duration * 0.9) for _ in range(CANDIDATE_COUNT)]
         try:
-            with get_video_clip(video_path) as clip:
-                duration = clip.duration
-                if duration < 0.1:
-                    return False, "视频过短"
-                frame = None
-                found_face = False
-                face_time = None
-                for _ in range(5):
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    try:
-                        temp_frame = clip.get_frame(t)
-                        if has_face(temp_frame):
-                            frame = temp_frame
-                            found_face = True
-                            face_time = t
-                            break
-                    except Exception:
-                        continue
-                if frame is None:
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    try:
-                        frame = clip.get_frame(t)
-                    except Exception as e:
-                        return False, f"获取视频帧失败: {str(e)}"
-                img = Image.fromarray(frame)
-                if size:
-                    try:
-                        img = img.resize(size, Image.LANCZOS)
-                    except Exception as e:
-                        return False, f"调整图片尺寸失败: {str(e)}"
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                img.save(output_path, "JPEG", quality=quality)
-                result = {
-                    "success": True,
-                    "message": "封面生成成功",
-                    "has_face": found_face,
-                    "timestamp": face_time if found_face else t
-                }
-                return True, result
-        except Exception:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return False, "无法打开视频"
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            duration = frames / fps if fps and fps > 0 and frames and frames > 0 else None
-            frame_rgb = None
-            found_face = False
-            face_time = None
-            t_used = 0
-            for _ in range(5):
-                if duration:
-                    t = random.uniform(duration * 0.1, duration * 0.9)
-                    idx = int(t * fps)
-                else:
-                    if frames and frames > 0:
-                        idx = int(random.uniform(0.1, 0.9) * frames)
-                        t = idx / fps if fps and fps > 0 else 0
-                    else:
-                        idx = 0
-                        t = 0
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, bgr = cap.read()
-                if not ret:
-                    continue
-                rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-                if has_face(rgb):
-                    frame_rgb = rgb
-                    found_face = True
-                    face_time = t
-                    t_used = t
-                    break
-                else:
-                    frame_rgb = rgb
-                    t_used = t
-            if frame_rgb is None:
-                cap.release()
-                return False, "无法读取视频帧"
-            cap.release()
-            img = Image.fromarray(frame_rgb)
-            if size:
-                try:
-                    img = img.resize(size, Image.LANCZOS)
-                except Exception as e:
-                    return False, f"调整图片尺寸失败: {str(e)}"
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path, "JPEG", quality=quality)
-            result = {
-                "success": True,
-                "message": "封面生成成功",
-                "has_face": found_face,
-                "timestamp": face_time if found_face else t_used
-            }
-            return True, result
+            # 在解码端缩放到目标尺寸，全尺寸帧不会进入Python
+            extracted = extract_frames(video_path, pick_times, size=size)
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"获取视频帧失败: {str(e)}"
+        faces = [bool(boxes) for boxes in detect(extracted.frames)]
+        # 排除黑场、白场和过场后优先选有人脸、画面评分最高的帧
+        index, scores = best_frame(extracted.frames, faces)
+        found_face = faces[index]
+        img = Image.fromarray(extracted.frames[index])
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        img.save(output_path, "JPEG", quality=quality)
+        result = {
+            "success": True,
+            "message": "封面生成成功",
+            "has_face": found_face,
+            "timestamp": extracted.timestamps[index],
+            "backend": extracted.backend,
+            "scores": scores
+        }
+        return True, result
     except Exception as e:
         return False, f"处理视频失败: {str(e)}"
 
@@ -183,26 +75,11 @@ def main():
     temp_dir = os.path.join(tempfile.gettempdir(), "thumbnails")
     os.makedirs(temp_dir, exist_ok=True)
     temp_output = os.path.join(temp_dir, "temp_thumbnail.jpg")
-    def collect_videos(root_dir, max_depth=2):
-        result = []
-        def walk(dir_path, depth):
-            try:
-                for name in os.listdir(dir_path):
-                    p = os.path.join(dir_path, name)
-                    if os.path.isfile(p) and any(name.lower().endswith(ext) for ext in SUPPORTED_EXTS):
-                        result.append(p)
-                    elif os.path.isdir(p) and depth < max_depth:
-                        walk(p, depth + 1)
-            except Exception:
-                pass
-        walk(root_dir, 0)
-        return result
-    videos = collect_videos(folder_path, max_depth=2)
-    if not videos:
-        print("⚠️ 选中文件夹下未发现支持的视频文件")
-        return
-    print(f"⏳ 共找到 {len(videos)} 个视频，开始生成封面...")
-    for video_path in videos:
+    # 边遍历目录边处理，不必等整个目录树扫描完成
+    print("⏳ 开始查找视频并生成封面...")
+    found = 0
+    for video_path in walk_videos(folder_path, max_depth=2, exts=SUPPORTED_EXTS):
+        found += 1
         print(f"🎞️ 处理: {os.path.basename(video_path)}")
         success, result = generate_random_thumbnail(video_path, temp_output, quality=quality, size=size)
         if success:
@@ -214,7 +91,7 @@ def main():
             except Exception as e:
                 result["warning"] = f"封面生成成功但无法保存到同级目录: {str(e)}"
             msg = "✅ 封面生成成功！"
-            msg += " 检测到人脸" if result.get("has_face") else " 使用随机帧"
+            msg += " 检测到人脸" if result.get("has_face") else " 按画面评分选帧"
             ts = result.get("timestamp")
             if isinstance(ts, (int, float)):
                 msg += f" 时间点: {ts:.2f}s"
@@ -225,6 +102,10 @@ def main():
             print(msg)
         else:
             print(f"❌ {os.path.basename(video_path)} 生成失败: {result}")
+    if not found:
+        print("⚠️ 选中文件夹下未发现支持的视频文件")
+    else:
+        print(f"📊 共处理 {found} 个视频")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""有界后台任务队列
+
+Web接口把耗时的封面生成提交到这里后立即返回任务ID，
+浏览器再通过轮询或SSE获取任务状态与进度。
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED_STATES = (DONE, FAILED)
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+class QueueFullError(Exception):
+    """等待中的任务数已达上限"""
+
+
+class JobQueue:
+    """固定线程数的任务池，限制排队任务数量并保留最近完成的任务状态
+
+    提交的函数会收到关键字参数 progress，调用 progress(percent, message) 上报进度；
+    函数返回值作为任务结果，抛出的异常信息作为任务错误。
+    initializer 在每个工作线程启动时调用一次，可用于加载线程私有的资源。
+    """
+
+    def __init__(self, max_workers=2, max_pending=32, max_history=200, on_discard=None, initializer=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job",
+                                            initializer=initializer)
+        self._max_pending = max_pending
+        self._max_history = max_history
+        self._on_discard = on_discard
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    def submit(self, func, *args, job_id=None, **kwargs):
+        """提交任务，返回任务ID；队列已满时抛出 QueueFullError
+
+        job_id 可由调用方预先生成（例如用于命名任务的输出），默认自动生成。
+        """
+        with self._cond:
+            if self._pending >= self._max_pending:
+                raise QueueFullError(f"任务队列已满（{self._max_pending}）")
+            job_id = job_id or new_job_id()
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "progress": 0,
+                "message": "排队中",
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "finished": None,
+                "version": 0,
+            }
+            self._pending += 1
+            self._trim_history()
+
+        def progress(percent, message=None):
+            self._update(job_id, progress=int(percent), message=message)
+
+        def run():
+            self._update(job_id, status=RUNNING, message="处理中")
+            try:
+                result = func(*args, progress=progress, **kwargs)
+            except Exception as e:
+                self._finish(job_id, status=FAILED, error=str(e), message="失败")
+            else:
+                self._finish(job_id, status=DONE, result=result, progress=100, message="完成")
+
+        self._executor.submit(run)
+        return job_id
+
+    def get(self, job_id):
+        """返回任务状态快照，任务不存在时返回None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for_change(self, job_id, version, timeout=15):
+        """阻塞直到任务版本号变化或超时，返回最新快照"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]["version"] != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def events(self, job_id, keepalive=15):
+        """生成任务状态变化序列，任务结束后停止；超时未变化时产出None作为心跳"""
+        job = self.get(job_id)
+        while job is not None:
+            yield job
+            if job["status"] in FINISHED_STATES:
+                return
+            version = job["version"]
+            job = self.wait_for_change(job_id, version, timeout=keepalive)
+            while job is not None and job["version"] == version:
+                yield None
+                job = self.wait_for_change(job_id, version, timeout=keepalive)
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for key, value in fields.items():
+                if value is not None:
+                    job[key] = value
+            job["version"] += 1
+            self._cond.notify_all()
+
+    def _finish(self, job_id, **fields):
+        with self._cond:
+            self._pending -= 1
+        self._update(job_id, finished=time.time(), **fields)
+
+    def _trim_history(self):
+        """只保留最近的已完成任务，调用时需持有锁"""
+        if len(self._jobs) <= self._max_history:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self._max_history:
+                break
+            job = self._jobs[job_id]
+            if job["status"] in FINISHED_STATES:
+                del self._jobs[job_id]
+                if self._on_discard:
+                    try:
+                        self._on_discard(job)
+                    except Exception as e:
+                        print(f"⚠️ 清理任务 {job_id} 时出错: {e}")
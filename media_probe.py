@@ -0,0 +1,323 @@
+"""带缓存的视频元数据探测
+
+一次 ffprobe 调用（JSON输出，只读取文件头）同时取得时长、帧率、分辨率、编码格式、旋转角度。
+结果以 (路径, 文件大小, 修改时间) 标识，缓存在内存LRU和SQLite中，
+之后的调用（包括下次运行）不必再读取文件头。ffprobe 不可用时退回 OpenCV 读取基本信息。
+
+keyframes() 返回完整的关键帧时间索引（只读取包标志，不解码），同样按文件标识缓存，
+供只解码关键帧的快速取帧模式使用。
+"""
+import bisect
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_util import connect
+
+FFPROBE_BIN = "ffprobe"
+FFMPEG_BIN = "ffmpeg"
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "thumbnails", "media_probe.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+-- 时间点相对文件开头（已减去 format.start_time），与ffmpeg输入端 -ss 一致
+CREATE TABLE IF NOT EXISTS keyframe_times (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    times TEXT NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _parse_rate(rate):
+    try:
+        num, _, den = (rate or "").partition("/")
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value if value > 0 else None
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _rotation(stream):
+    """旋转角度可能在 tags.rotate（旧版）或 side_data 的 rotation 中"""
+    rotate = (stream.get("tags") or {}).get("rotate")
+    if rotate is None:
+        for side_data in stream.get("side_data_list") or []:
+            if "rotation" in side_data:
+                rotate = side_data["rotation"]
+                break
+    try:
+        return int(float(rotate)) % 360 if rotate is not None else 0
+    except ValueError:
+        return 0
+
+
+def _keyframe_times(packets, start_time=0.0):
+    """返回带K标志的视频包的时间点（已排序）
+
+    start_time 为文件的起始时间，从 pts_time 中减去后与ffmpeg输入端 -ss 的时间基准一致。
+    """
+    times = []
+    for packet in packets:
+        if "K" not in (packet.get("flags") or ""):
+            continue
+        try:
+            times.append(float(packet["pts_time"]) - start_time)
+        except (KeyError, TypeError, ValueError):
+            continue
+    times.sort()
+    return times
+
+
+def ffprobe_info(video_path):
+    """调用一次 ffprobe，返回元数据字典"""
+    out = subprocess.run([
+        FFPROBE_BIN, "-v", "error", "-select_streams", "v:0",
+        "-show_entries",
+        "format=duration:stream=codec_name,width,height,avg_frame_rate,r_frame_rate,duration"
+        ":stream_tags=rotate:stream_side_data=rotation",
+        "-of", "json", video_path
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True)
+    data = json.loads(out.stdout)
+    streams = data.get("streams") or []
+    if not streams:
+        raise RuntimeError("未找到视频流")
+    stream = streams[0]
+    return {
+        "duration": _to_float((data.get("format") or {}).get("duration")) or _to_float(stream.get("duration")),
+        "fps": _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate")),
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "codec": stream.get("codec_name"),
+        "rotation": _rotation(stream),
+        "prober": "ffprobe",
+    }
+
+
+def ffprobe_keyframes(video_path):
+    """读取全部视频包的标志得到关键帧时间点，只解复用不解码"""
+    out = subprocess.run([
+        FFPROBE_BIN, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "format=start_time:packet=pts_time,flags", "-of", "json", video_path
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True)
+    data = json.loads(out.stdout)
+    # MPEG-TS等格式的时间戳不从0开始，-ss 却是从文件开头算起
+    try:
+        start_time = float((data.get("format") or {}).get("start_time") or 0)
+    except ValueError:
+        start_time = 0.0
+    return _keyframe_times(data.get("packets") or [], start_time)
+
+
+_SHOWINFO_PTS = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+def ffmpeg_keyframes(video_path):
+    """ffprobe 不可用时让ffmpeg只解码关键帧，从 showinfo 输出中读取时间点"""
+    out = subprocess.run([
+        FFMPEG_BIN, "-hide_banner", "-nostdin", "-skip_frame", "nokey", "-i", video_path,
+        "-map", "0:v:0", "-vf", "showinfo", "-fps_mode", "passthrough", "-f", "null", "-"
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True, text=True, errors="replace")
+    return sorted(float(t) for t in _SHOWINFO_PTS.findall(out.stderr))
+
+
+def snap_to_keyframes(timestamps, keyframes):
+    """把每个时间点换成最近的关键帧时间，去重后按时间排序"""
+    if not keyframes:
+        return sorted(timestamps)
+    snapped = set()
+    for t in timestamps:
+        i = bisect.bisect_left(keyframes, t)
+        neighbours = keyframes[max(i - 1, 0):i + 1]
+        snapped.add(min(neighbours, key=lambda k: abs(k - t)))
+    return sorted(snapped)
+
+
+def opencv_info(video_path):
+    """ffprobe 不可用时用 OpenCV 读取基本元数据"""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise RuntimeError("无法打开视频")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fps = fps if fps and fps > 0 else None
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ").lower() or None
+        return {
+            "duration": frames / fps if fps and frames and frames > 0 else None,
+            "fps": fps,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or None,
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None,
+            "codec": codec,
+            "rotation": 0,
+            "prober": "opencv",
+        }
+    finally:
+        cap.release()
+
+
+class MediaProbe:
+    """元数据探测结果的两级缓存：进程内LRU + SQLite"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_memory_entries=4096):
+        self._db_path = db_path
+        self._max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._keyframes = OrderedDict()
+        self._lock = threading.Lock()
+        self._ffprobe_missing = False
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            with connect(self._db_path) as conn:
+                conn.executescript(_SCHEMA)
+
+    def _remember(self, key, info, memory=None):
+        memory = self._memory if memory is None else memory
+        with self._lock:
+            memory[key] = info
+            memory.move_to_end(key)
+            while len(memory) > self._max_memory_entries:
+                memory.popitem(last=False)
+
+    def _probe_file(self, video_path):
+        if not self._ffprobe_missing:
+            try:
+                return ffprobe_info(video_path)
+            except FileNotFoundError:
+                # 没有安装ffprobe，本进程内不再尝试
+                self._ffprobe_missing = True
+        return opencv_info(video_path)
+
+    def probe(self, video_path):
+        """返回视频元数据字典，文件未变化时直接使用缓存
+
+        字段: duration, fps, width, height, codec, rotation, prober
+        """
+        st = os.stat(video_path)
+        key = (video_path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            info = self._memory.get(key)
+            if info is not None:
+                self._memory.move_to_end(key)
+                return dict(info)
+
+        if self._db_path:
+            try:
+                with connect(self._db_path) as conn:
+                    row = conn.execute(
+                        "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute("UPDATE probes SET last_used = ? WHERE path = ?", (time.time(), video_path))
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                info = json.loads(row[0])
+                self._remember(key, info)
+                return dict(info)
+
+        info = self._probe_file(video_path)
+        self._remember(key, info)
+        if self._db_path:
+            try:
+                with connect(self._db_path) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO probes (path, size, mtime_ns, info, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (*key, json.dumps(info), time.time())
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ 保存视频元数据缓存失败: {e}")
+        return dict(info)
+
+    def keyframes(self, video_path):
+        """返回关键帧时间点列表（秒，已排序），文件未变化时直接使用缓存"""
+        st = os.stat(video_path)
+        key = (video_path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            times = self._keyframes.get(key)
+            if times is not None:
+                self._keyframes.move_to_end(key)
+                return list(times)
+
+        if self._db_path:
+            try:
+                with connect(self._db_path) as conn:
+                    row = conn.execute(
+                        "SELECT times FROM keyframe_times WHERE path = ? AND size = ? AND mtime_ns = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute("UPDATE keyframe_times SET last_used = ? WHERE path = ?", (time.time(), video_path))
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                times = json.loads(row[0])
+                self._remember(key, times, self._keyframes)
+                return list(times)
+
+        times = None
+        if not self._ffprobe_missing:
+            try:
+                times = ffprobe_keyframes(video_path)
+            except FileNotFoundError:
+                self._ffprobe_missing = True
+        if times is None:
+            times = ffmpeg_keyframes(video_path)
+        self._remember(key, times, self._keyframes)
+        if self._db_path:
+            try:
+                with connect(self._db_path) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO keyframe_times (path, size, mtime_ns, times, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (*key, json.dumps(times), time.time())
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ 保存关键帧索引失败: {e}")
+        return list(times)
+
+
+_default_probe = None
+_default_lock = threading.Lock()
+
+
+def get_default_probe():
+    """各脚本共用的探测缓存，首次使用时创建"""
+    global _default_probe
+    with _default_lock:
+        if _default_probe is None:
+            _default_probe = MediaProbe()
+        return _default_probe
+
+
+def probe(video_path):
+    """使用默认缓存探测视频元数据，见 MediaProbe.probe"""
+    return get_default_probe().probe(video_path)
+
+
+def keyframes(video_path):
+    """使用默认缓存读取关键帧索引，见 MediaProbe.keyframes"""
+    return get_default_probe().keyframes(video_path)
@@ -0,0 +1,120 @@
+"""分阶段的生产者/消费者流水线
+
+每个阶段有自己的线程数，阶段之间用有界队列连接：某个阶段变慢（例如写入SMB共享）时
+只会让它前面的队列排满并暂时挡住上游，而不会让其他阶段空等。ffmpeg解码、NumPy计算、
+JPEG编码和文件I/O都会释放GIL，因此使用线程即可让CPU和网络I/O重叠。
+
+流经流水线的每一项是一个字典。阶段函数接收并返回该字典；将 item["done"] 设为 True
+表示后续阶段无需处理（例如图片已存在），阶段函数抛出的异常记录在 item["error"] 中。
+"""
+import queue
+import threading
+
+_END = object()
+
+
+class Stage:
+    """流水线中的一个阶段"""
+
+    def __init__(self, name, func, workers=1, queue_size=8):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue_size = queue_size
+
+
+def parse_stage_workers(spec):
+    """解析 "decode=4,write=8" 形式的各阶段线程数"""
+    workers = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        if not sep or not value.strip().isdigit() or int(value) < 1:
+            raise ValueError(f"无效的阶段线程数设置: {part}")
+        workers[name.strip()] = int(value)
+    return workers
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        self._stop = threading.Event()
+
+    def _put(self, q, item):
+        """放入队列；流水线被停止时放弃"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed(self, items, out_q):
+        try:
+            for item in items:
+                if not self._put(out_q, item):
+                    return
+        except Exception as e:
+            print(f"⚠️ 读取任务来源失败: {e}")
+        finally:
+            self._put(out_q, _END)
+
+    def _work(self, stage, in_q, out_q, remaining, lock):
+        while True:
+            item = self._get(in_q)
+            if item is _END:
+                # 让同阶段的其他线程也能收到结束标记，最后一个线程再通知下游
+                self._put(in_q, _END)
+                break
+            if not item.get("done"):
+                try:
+                    item = stage.func(item)
+                except Exception as e:
+                    item["error"] = f"{stage.name}: {e}"
+                    item["done"] = True
+            if not self._put(out_q, item):
+                return
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._put(out_q, _END)
+
+    def run(self, items):
+        """处理 items 中的每一项，按完成顺序产出处理后的字典"""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.stages[-1].queue_size))
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-source", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            remaining, lock = [stage.workers], threading.Lock()
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, args=(stage, queues[i], queues[i + 1], remaining, lock),
+                    name=f"pipeline-{stage.name}-{n}", daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            # 调用方提前停止迭代时让所有线程退出
+            self._stop.set()
+
+
+def run_pipeline(items, stages):
+    """见 Pipeline.run"""
+    return Pipeline(stages).run(items)
@@ -0,0 +1,49 @@
+"""内存中的封面预览缓存
+
+按任务ID保存编码好的JPEG数据，总字节数超过上限时淘汰最久未访问的条目。
+"""
+import threading
+from collections import OrderedDict
+
+
+class PreviewStore:
+    """线程安全、按字节数限制大小的LRU缓存"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        """保存一份预览数据，超过单条上限的数据不缓存"""
+        data = bytes(data)
+        if len(data) > self._max_bytes:
+            return False
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+            self._items[key] = data
+            self._total += len(data)
+            while self._total > self._max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._total -= len(evicted)
+        return True
+
+    def get(self, key):
+        """取出预览数据并标记为最近使用，不存在时返回None"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._total
@@ -0,0 +1,88 @@
+"""从同一帧生成多种输出图片
+
+一次解码得到的帧（RGB数组）可以同时输出多种规格的图片，例如2:3竖向的poster和
+完整画面的fanart。裁剪通过数组切片完成（不复制像素），之后只缩放和编码一次。
+提供画面主体框时，裁剪窗口由 crop_planner 按主体位置放置，否则从中央截取。
+"""
+import io
+import os
+import threading
+
+from PIL import Image
+
+from crop_planner import apply_crop, plan_crop
+
+
+class Rendition:
+    """一种输出规格
+
+    ratio: 目标宽高比（宽/高），按画面主体或从中央截取；None 表示保留完整画面
+    size: (宽, 高)，指定时缩放到该尺寸
+    max_width: 未指定 size 时限制的最大宽度，作用于裁剪前的完整画面（与先缩放再裁剪的结果一致）
+    output: 输出路径或文件对象；为 None 时渲染结果以字节形式返回
+    """
+
+    def __init__(self, name, output=None, ratio=None, size=None, max_width=None, quality=100):
+        self.name = name
+        self.output = output
+        self.ratio = ratio
+        self.size = size
+        self.max_width = max_width
+        self.quality = quality
+
+
+def crop_to_ratio(frame, ratio, subjects=None):
+    """从 (H, W, 3) 数组截取指定宽高比的区域，返回视图而非副本
+
+    subjects: 可选的主体框列表 [(x, y, w, h), ...]，窗口尽量包含这些框；未提供时从中央截取。
+    """
+    height, width = frame.shape[:2]
+    return apply_crop(frame, plan_crop((width, height), ratio, subjects))
+
+
+def render(frame, rendition, subjects=None):
+    """按规格输出一张图片，返回 (成功与否, 结果字典或错误信息)"""
+    try:
+        region = crop_to_ratio(frame, rendition.ratio, subjects) if rendition.ratio else frame
+        img = Image.fromarray(region)
+        try:
+            if rendition.size and len(rendition.size) == 2:
+                img = img.resize(tuple(rendition.size), Image.LANCZOS)
+            elif rendition.max_width and frame.shape[1] > rendition.max_width:
+                # 按完整画面的缩放比例缩放裁剪区域，只缩放需要的像素
+                scale = rendition.max_width / frame.shape[1]
+                img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+        except Exception as e:
+            return False, f"调整图片尺寸失败: {str(e)}"
+
+        output = rendition.output
+        buffer = io.BytesIO() if output is None else None
+        if isinstance(output, str):
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        img.save(buffer if buffer is not None else output, "JPEG", quality=rendition.quality)
+        result = {"name": rendition.name, "width": img.width, "height": img.height}
+        if buffer is not None:
+            result["data"] = buffer.getvalue()
+        return True, result
+    except Exception as e:
+        return False, f"保存图片失败: {str(e)}"
+
+
+def render_all(frame, renditions, subjects=None):
+    """用同一帧输出多种规格，返回 {名称: (成功与否, 结果)}"""
+    return {rendition.name: render(frame, rendition, subjects) for rendition in renditions}
+
+
+def write_output(path, data):
+    """把编码好的图片写入目标路径：先写同目录下的临时文件再替换，避免留下不完整的图片"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,132 @@
+"""持久化的封面生成结果缓存
+
+以 (视频路径, 文件大小, 修改时间, 输出尺寸, 质量) 标识一次生成结果，记录选中的时间点、
+是否检测到人脸以及编码后图片的存放位置。源视频变化后对应条目失效，
+缓存图片总大小超过上限时按最近使用时间淘汰。
+"""
+import hashlib
+import os
+import threading
+import time
+
+from sqlite_util import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT NOT NULL,
+    out_size TEXT NOT NULL,
+    quality INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    timestamp REAL,
+    has_face INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, out_size, quality)
+)
+"""
+
+
+def _size_key(out_size):
+    return f"{out_size[0]}x{out_size[1]}" if out_size else "original"
+
+
+class ResultCache:
+    """基于SQLite的结果索引，图片数据以文件形式保存在 cache_dir 下"""
+
+    def __init__(self, db_path, cache_dir, max_bytes=512 * 1024 * 1024):
+        self._db_path = db_path
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with connect(self._db_path) as conn:
+            conn.execute(_SCHEMA)
+
+    def _remove_files(self, outputs):
+        for output in outputs:
+            try:
+                os.remove(output)
+            except OSError:
+                pass
+
+    def get(self, video_path, out_size=None, quality=100):
+        """查找未失效的缓存结果，命中时返回包含图片数据的字典，否则返回None"""
+        st = os.stat(video_path)
+        size_key = _size_key(out_size)
+        with self._lock, connect(self._db_path) as conn:
+            # 源视频已变化的条目全部失效
+            stale = conn.execute(
+                "SELECT output FROM results WHERE path = ? AND (size != ? OR mtime_ns != ?)",
+                (video_path, st.st_size, st.st_mtime_ns)
+            ).fetchall()
+            if stale:
+                conn.execute(
+                    "DELETE FROM results WHERE path = ? AND (size != ? OR mtime_ns != ?)",
+                    (video_path, st.st_size, st.st_mtime_ns)
+                )
+                self._remove_files(row[0] for row in stale)
+
+            row = conn.execute(
+                "SELECT timestamp, has_face, output FROM results WHERE path = ? AND out_size = ? AND quality = ?",
+                (video_path, size_key, quality)
+            ).fetchone()
+            if row is None:
+                return None
+            timestamp, has_face, output = row
+            try:
+                with open(output, "rb") as f:
+                    data = f.read()
+            except OSError:
+                conn.execute(
+                    "DELETE FROM results WHERE path = ? AND out_size = ? AND quality = ?",
+                    (video_path, size_key, quality)
+                )
+                return None
+            conn.execute(
+                "UPDATE results SET last_used = ? WHERE path = ? AND out_size = ? AND quality = ?",
+                (time.time(), video_path, size_key, quality)
+            )
+        return {"timestamp": timestamp, "has_face": bool(has_face), "output": output, "data": data}
+
+    def put(self, video_path, data, timestamp, has_face, out_size=None, quality=100):
+        """保存一次生成结果，返回缓存图片的路径"""
+        st = os.stat(video_path)
+        size_key = _size_key(out_size)
+        digest = hashlib.sha1(f"{video_path}|{size_key}|{quality}".encode("utf-8")).hexdigest()
+        output = os.path.join(self._cache_dir, f"{digest}.jpg")
+        tmp_output = f"{output}.{threading.get_ident()}.tmp"
+        with open(tmp_output, "wb") as f:
+            f.write(data)
+        os.replace(tmp_output, output)
+
+        with self._lock, connect(self._db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(path, out_size, quality, size, mtime_ns, timestamp, has_face, output, bytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_path, size_key, quality, st.st_size, st.st_mtime_ns,
+                 timestamp, int(bool(has_face)), output, len(data), time.time())
+            )
+            self._evict(conn)
+        return output
+
+    def _evict(self, conn):
+        """总大小超过上限时删除最久未使用的条目，调用时需持有锁"""
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        removed = []
+        for path, size_key, quality, output, nbytes in conn.execute(
+            "SELECT path, out_size, quality, output, bytes FROM results ORDER BY last_used"
+        ).fetchall():
+            if total <= self._max_bytes:
+                break
+            conn.execute(
+                "DELETE FROM results WHERE path = ? AND out_size = ? AND quality = ?",
+                (path, size_key, quality)
+            )
+            removed.append(output)
+            total -= nbytes
+        self._remove_files(removed)
@@ -0,0 +1,19 @@
+"""各缓存模块共用的SQLite连接辅助函数"""
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(db_path, pragmas=()):
+    """打开连接，退出时提交事务并关闭
+
+    pragmas: 每次连接后执行的PRAGMA设置，例如 ("synchronous=NORMAL",)
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for pragma in pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
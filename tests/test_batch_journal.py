@@ -0,0 +1,66 @@
+import os
+
+from batch_journal import DONE, FAILED, BatchJournal
+
+
+def make_video(folder, name):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"video")
+    return path
+
+
+def dir_mtimes(*folders):
+    return {folder: os.stat(folder).st_mtime_ns for folder in folders}
+
+
+def test_completed_requires_done_status_and_unchanged_folder(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    a, b = str(tmp_path / "a"), str(tmp_path / "b")
+    done = make_video(a, "done.mp4")
+    failed = make_video(b, "failed.mp4")
+    journal.record(done, DONE, {"poster": "abc"})
+    journal.record(failed, FAILED)
+
+    assert journal.completed([done, failed], dir_mtimes(a, b)) == {done}
+    # 只返回本次要处理的视频
+    assert journal.completed([failed], dir_mtimes(a, b)) == set()
+
+
+def test_completed_is_invalidated_when_the_folder_changes(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    folder = str(tmp_path / "a")
+    video = make_video(folder, "v.mp4")
+    journal.record(video, DONE)
+    mtimes = dir_mtimes(folder)
+    assert journal.completed([video], mtimes) == {video}
+
+    # 例如poster.jpg被删除后目录的修改时间变化
+    mtimes[folder] += 1
+    assert journal.completed([video], mtimes) == set()
+    assert journal.completed([video], {}) == set()
+
+
+def test_record_replaces_previous_status(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    folder = str(tmp_path / "a")
+    video = make_video(folder, "v.mp4")
+    journal.record(video, FAILED)
+    journal.record(video, DONE)
+    assert journal.completed([video], dir_mtimes(folder)) == {video}
+
+
+def test_dir_listing_is_reused_only_while_mtime_matches(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    journal.put_dir("/media/show", 100, ["Season 1"], ["pilot.mkv"])
+    assert journal.get_dir("/media/show", 100) == (["Season 1"], ["pilot.mkv"])
+    assert journal.get_dir("/media/show", 101) is None
+
+
+def test_journal_survives_reopening(tmp_path):
+    db_path = str(tmp_path / "nested" / "journal.db")
+    folder = str(tmp_path / "a")
+    video = make_video(folder, "v.mp4")
+    BatchJournal(db_path).record(video, DONE)
+    assert BatchJournal(db_path).completed([video], dir_mtimes(folder)) == {video}
@@ -0,0 +1,66 @@
+import numpy as np
+
+from crop_planner import apply_crop, cover_size, plan_crop
+
+
+def contains(window, box):
+    x, y, w, h = window
+    bx, by, bw, bh = box
+    return x <= bx and y <= by and bx + bw <= x + w and by + bh <= y + h
+
+
+def test_centre_crop_without_subjects():
+    assert plan_crop((1920, 1080), 2 / 3) == (600, 0, 720, 1080)
+    assert plan_crop((1440, 1080), 16 / 9) == (0, 135, 1440, 810)
+
+
+def test_crop_matches_frame_when_ratio_is_exact():
+    # int(500 * 2/3) == 333，整幅画面即为2:3，不能少一行
+    assert plan_crop((333, 500), 2 / 3) == (0, 0, 333, 500)
+
+
+def test_subject_that_fits_is_never_cut():
+    box = (0, 100, 1080, 550)
+    window = plan_crop((1080, 1920), 16 / 9, [box])
+    assert window[2:] == (1080, 607)
+    assert contains(window, box)
+
+
+def test_subject_at_edge_clamps_to_frame():
+    assert plan_crop((1920, 1080), 2 / 3, [(1800, 100, 120, 120)]) == (1200, 0, 720, 1080)
+    assert plan_crop((1920, 1080), 2 / 3, [(0, 100, 120, 120)]) == (0, 0, 720, 1080)
+
+
+def test_face_anchor_keeps_headroom():
+    x, y, w, h = plan_crop((1080, 1920), 16 / 9, [(500, 900, 100, 100)])
+    assert contains((x, y, w, h), (500, 900, 100, 100))
+    # 人脸中心位于窗口偏上的位置
+    assert (950 - y) / h < 0.5
+
+
+def test_subjects_too_far_apart_keep_primary():
+    boxes = [(1700, 100, 200, 200), (0, 100, 100, 100)]
+    window = plan_crop((1920, 1080), 2 / 3, boxes)
+    assert contains(window, boxes[0])
+
+
+def test_subject_larger_than_window_is_centred():
+    x, _, w, _ = plan_crop((1920, 1080), 2 / 3, [(200, 0, 1000, 1000)])
+    assert x == 200 + (1000 - w) // 2
+
+
+def test_apply_crop_is_a_view():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    region = apply_crop(frame, (600, 0, 720, 1080))
+    assert region.shape == (1080, 720, 3)
+    assert np.shares_memory(region, frame)
+
+
+def test_cover_size():
+    assert cover_size((3840, 2160), (1920, 1080)) == (1920, 1080)
+    assert cover_size((1440, 1080), (1920, 1080)) == (1920, 1440)
+    assert cover_size((1080, 1920), (1920, 1080)) == (1920, 3414)
+    assert cover_size((640, 360), (1920, 1080)) == (1920, 1080)
+    # 结果不小于目标尺寸
+    width, height = cover_size((1001, 563), (1920, 1080))
+    assert width >= 1920 and height >= 1080
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from frame_extractor import _parse_ppm_stream
+
+
+def ppm(frame, header=None):
+    height, width = frame.shape[:2]
+    header = header or f"P6\n{width} {height}\n255\n"
+    return header.encode() + frame.tobytes()
+
+
+def test_parses_consecutive_frames():
+    first = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    second = np.full((4, 1, 3), 200, dtype=np.uint8)
+    frames = _parse_ppm_stream(ppm(first) + ppm(second))
+    assert len(frames) == 2
+    np.testing.assert_array_equal(frames[0], first)
+    np.testing.assert_array_equal(frames[1], second)
+
+
+def test_pixel_data_starting_with_whitespace_bytes():
+    # 像素值10、32与换行、空格相同，头部之后只能跳过一个空白字符
+    frame = np.array([[[10, 32, 10], [32, 9, 13]]], dtype=np.uint8)
+    frames = _parse_ppm_stream(ppm(frame, "P6 2  1\n255 "))
+    np.testing.assert_array_equal(frames[0], frame)
+
+
+def test_frames_are_views_of_the_input():
+    data = ppm(np.zeros((2, 2, 3), dtype=np.uint8))
+    frame = _parse_ppm_stream(data)[0]
+    assert not frame.flags.writeable
+    assert np.shares_memory(frame, np.frombuffer(data, dtype=np.uint8))
+
+
+def test_empty_stream():
+    assert _parse_ppm_stream(b"") == []
+
+
+def test_rejects_other_formats():
+    with pytest.raises(ValueError):
+        _parse_ppm_stream(b"P5\n1 1\n255\n\x00")
+    with pytest.raises(ValueError):
+        _parse_ppm_stream(b"P6\n1 1\n65535\n" + b"\x00" * 6)
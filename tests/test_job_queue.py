@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from job_queue import DONE, FAILED, FINISHED_STATES, JobQueue, QueueFullError
+
+
+def wait_finished(jobs, job_id):
+    for job in jobs.events(job_id, keepalive=1):
+        if job is not None and job["status"] in FINISHED_STATES:
+            return job
+
+
+def blocked(release):
+    def func(progress):
+        release.wait(5)
+        return "ok"
+    return func
+
+
+def test_result_progress_and_error_are_recorded():
+    jobs = JobQueue(max_workers=1)
+
+    def work(progress):
+        progress(50, "一半")
+        return {"saved": True}
+
+    def fail(progress):
+        raise RuntimeError("无法读取视频帧")
+
+    done = wait_finished(jobs, jobs.submit(work))
+    assert (done["status"], done["result"], done["progress"]) == (DONE, {"saved": True}, 100)
+    failed = wait_finished(jobs, jobs.submit(fail))
+    assert (failed["status"], failed["error"]) == (FAILED, "无法读取视频帧")
+
+
+def test_pending_jobs_are_bounded():
+    release = threading.Event()
+    jobs = JobQueue(max_workers=1, max_pending=2)
+    first = jobs.submit(blocked(release))
+    jobs.submit(blocked(release))
+    with pytest.raises(QueueFullError):
+        jobs.submit(blocked(release))
+    release.set()
+    wait_finished(jobs, first)
+    # 任务结束后释放名额
+    assert wait_finished(jobs, jobs.submit(blocked(release)))["status"] == DONE
+
+
+def test_history_keeps_recent_finished_jobs():
+    discarded = []
+    jobs = JobQueue(max_workers=1, max_history=3, on_discard=lambda job: discarded.append(job["id"]))
+    ids = []
+    for _ in range(5):
+        ids.append(jobs.submit(lambda progress: None))
+        wait_finished(jobs, ids[-1])
+    assert discarded == ids[:2]
+    assert [jobs.get(job_id) is not None for job_id in ids] == [False, False, True, True, True]
+
+
+def test_history_never_drops_unfinished_jobs():
+    release = threading.Event()
+    jobs = JobQueue(max_workers=1, max_pending=10, max_history=2)
+    ids = [jobs.submit(blocked(release)) for _ in range(4)]
+    assert all(jobs.get(job_id) is not None for job_id in ids)
+    release.set()
+    for job_id in ids:
+        wait_finished(jobs, job_id)
+
+
+def test_custom_job_id():
+    jobs = JobQueue(max_workers=1)
+    assert jobs.submit(lambda progress: 1, job_id="abc") == "abc"
+    assert wait_finished(jobs, "abc")["result"] == 1
+    assert jobs.get("missing") is None
@@ -0,0 +1,36 @@
+from media_probe import _keyframe_times, snap_to_keyframes
+
+
+def test_snap_to_nearest_keyframe():
+    keyframes = [0.0, 2.0, 4.0, 10.0]
+    assert snap_to_keyframes([0.4, 3.9, 6.5, 8.0], keyframes) == [0.0, 4.0, 10.0]
+
+
+def test_snap_merges_duplicates_and_sorts():
+    assert snap_to_keyframes([9.0, 1.2, 0.9, 8.8], [1.0, 9.0]) == [1.0, 9.0]
+
+
+def test_snap_outside_the_index_uses_the_nearest_end():
+    keyframes = [1.0, 2.0]
+    assert snap_to_keyframes([-5.0, 0.0], keyframes) == [1.0]
+    assert snap_to_keyframes([2.0, 100.0], keyframes) == [2.0]
+
+
+def test_snap_tie_prefers_the_earlier_keyframe():
+    assert snap_to_keyframes([3.0], [2.0, 4.0]) == [2.0]
+
+
+def test_snap_without_keyframes_keeps_timestamps():
+    assert snap_to_keyframes([5.0, 1.0], []) == [1.0, 5.0]
+
+
+def test_keyframe_times_filters_flags_and_subtracts_start_time():
+    packets = [
+        {"pts_time": "1.900000", "flags": "K__"},
+        {"pts_time": "1.400000", "flags": "K_"},
+        {"pts_time": "1.500000", "flags": "__"},
+        {"pts_time": "N/A", "flags": "K_"},
+        {"flags": "K_"},
+        {"pts_time": "2.400000"},
+    ]
+    assert _keyframe_times(packets, start_time=1.4) == [0.0, 0.5]
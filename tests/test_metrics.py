@@ -0,0 +1,52 @@
+import pytest
+
+from metrics import Counter, Histogram, Registry
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    counter = Counter("thumbnail_generations", "封面生成次数", labelnames=("source", "result"), registry=registry)
+    histogram = Histogram("thumbnail_stage_seconds", "阶段耗时", labelnames=("stage",), buckets=(0.1, 1),
+                          registry=registry)
+    counter.inc(source="job", result="success")
+    counter.inc(2, source="batch", result="failure")
+    histogram.observe(0.25, stage="decode")
+    histogram.observe(0.5, stage="decode")
+    histogram.observe(2, stage="encode")
+
+    assert registry.render() == "\n".join([
+        "# HELP thumbnail_generations 封面生成次数",
+        "# TYPE thumbnail_generations counter",
+        'thumbnail_generations_total{source="batch",result="failure"} 2',
+        'thumbnail_generations_total{source="job",result="success"} 1',
+        "# HELP thumbnail_stage_seconds 阶段耗时",
+        "# TYPE thumbnail_stage_seconds histogram",
+        'thumbnail_stage_seconds_bucket{stage="decode",le="0.1"} 0',
+        'thumbnail_stage_seconds_bucket{stage="decode",le="1"} 2',
+        'thumbnail_stage_seconds_bucket{stage="decode",le="+Inf"} 2',
+        'thumbnail_stage_seconds_sum{stage="decode"} 0.75',
+        'thumbnail_stage_seconds_count{stage="decode"} 2',
+        'thumbnail_stage_seconds_bucket{stage="encode",le="0.1"} 0',
+        'thumbnail_stage_seconds_bucket{stage="encode",le="1"} 0',
+        'thumbnail_stage_seconds_bucket{stage="encode",le="+Inf"} 1',
+        'thumbnail_stage_seconds_sum{stage="encode"} 2',
+        'thumbnail_stage_seconds_count{stage="encode"} 1',
+    ]) + "\n"
+
+
+def test_metric_without_labels_and_escaping():
+    registry = Registry()
+    Counter("bytes_written", "写入字节数", registry=registry).inc(512)
+    Counter("failures", "失败次数", labelnames=("reason",), registry=registry).inc(reason='a"b\\c\nd')
+    lines = registry.render().splitlines()
+    assert "bytes_written_total 512" in lines
+    assert 'failures_total{reason="a\\"b\\\\c\\nd"} 1' in lines
+
+
+def test_labels_must_match_and_names_are_unique():
+    registry = Registry()
+    counter = Counter("uses", "使用次数", labelnames=("backend",), registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc(codec="h264")
+    with pytest.raises(ValueError):
+        Counter("uses", "重复", registry=registry)
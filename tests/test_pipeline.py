@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Stage, parse_stage_workers, run_pipeline
+
+
+def collect(items, stages, timeout=5):
+    """在后台线程中跑完流水线，超时说明结束标记没有传到下游"""
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(run_pipeline(items, stages)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "流水线没有结束"
+    return results
+
+
+def pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
+
+
+def wait_for_threads_to_exit(timeout=5):
+    deadline = time.monotonic() + timeout
+    while pipeline_threads() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return pipeline_threads()
+
+
+def add(key):
+    def func(item):
+        item[key] = True
+        return item
+    return func
+
+
+def test_every_item_passes_every_stage_with_many_workers():
+    stages = [Stage("a", add("a"), workers=3, queue_size=2), Stage("b", add("b"), workers=4, queue_size=1),
+              Stage("c", add("c"), workers=1)]
+    results = collect(({"n": n} for n in range(50)), stages)
+    assert sorted(item["n"] for item in results) == list(range(50))
+    assert all(item["a"] and item["b"] and item["c"] for item in results)
+    assert not wait_for_threads_to_exit()
+
+
+def test_empty_source_ends_the_pipeline():
+    assert collect(iter([]), [Stage("a", add("a"), workers=2), Stage("b", add("b"), workers=2)]) == []
+
+
+def test_stage_error_is_captured_and_later_stages_are_skipped():
+    calls = []
+
+    def fail_on_odd(item):
+        if item["n"] % 2:
+            raise RuntimeError("坏文件")
+        return item
+
+    def record(item):
+        calls.append(item["n"])
+        return item
+
+    results = collect(({"n": n} for n in range(6)), [Stage("decode", fail_on_odd), Stage("write", record)])
+    errors = {item["n"]: item.get("error") for item in results}
+    assert errors == {0: None, 1: "decode: 坏文件", 2: None, 3: "decode: 坏文件", 4: None, 5: "decode: 坏文件"}
+    assert sorted(calls) == [0, 2, 4]
+
+
+def test_done_items_skip_later_stages():
+    calls = []
+
+    def plan(item):
+        item["done"] = item["n"] == 1
+        return item
+
+    def decode(item):
+        calls.append(item["n"])
+        return item
+
+    results = collect(({"n": n} for n in range(3)), [Stage("plan", plan), Stage("decode", decode)])
+    assert len(results) == 3
+    assert sorted(calls) == [0, 2]
+
+
+def test_source_error_still_ends_the_pipeline():
+    def items():
+        yield {"n": 0}
+        raise OSError("目录不可读")
+
+    assert [item["n"] for item in collect(items(), [Stage("a", add("a"), workers=2)])] == [0]
+
+
+def test_stopping_early_shuts_down_all_threads():
+    def endless():
+        n = 0
+        while True:
+            yield {"n": n}
+            n += 1
+
+    results = run_pipeline(endless(), [Stage("a", add("a"), workers=2), Stage("b", add("b"), workers=2)])
+    assert next(results)["a"]
+    results.close()
+    assert not wait_for_threads_to_exit()
+
+
+def test_parse_stage_workers():
+    assert parse_stage_workers("decode=4, write=8") == {"decode": 4, "write": 8}
+    assert parse_stage_workers("") == {}
+    for spec in ("decode", "decode=0", "decode=x"):
+        with pytest.raises(ValueError):
+            parse_stage_workers(spec)
@@ -0,0 +1,27 @@
+from preview_store import PreviewStore
+
+
+def test_least_recently_used_entry_is_evicted():
+    store = PreviewStore(max_bytes=10)
+    store.put("a", b"1234")
+    store.put("b", b"1234")
+    assert store.get("a") == b"1234"  # a 变为最近使用
+    store.put("c", b"1234")
+    assert store.get("b") is None
+    assert store.get("a") == b"1234" and store.get("c") == b"1234"
+    assert (len(store), store.total_bytes) == (2, 8)
+
+
+def test_replacing_a_key_updates_the_total():
+    store = PreviewStore(max_bytes=10)
+    store.put("a", b"12345678")
+    store.put("a", b"12")
+    assert (len(store), store.total_bytes) == (1, 2)
+
+
+def test_oversized_data_is_not_cached():
+    store = PreviewStore(max_bytes=4)
+    store.put("a", b"12")
+    assert store.put("big", b"12345") is False
+    assert store.get("big") is None
+    assert store.get("a") == b"12"
@@ -4,6 +4,7 @@ import random
 import tempfile
 import shutil
 from tkinter import Tk, filedialog
+from video_walker import walk_videos
 
 # 尝试导入PIL库，如果失败提供更详细的错误信息
 try:
@@ -30,30 +31,14 @@ def choose_folder():
 
 def collect_videos(root_dir, max_depth=2):
     """收集指定目录下的视频文件"""
-    result = []
     error_dirs = []
     
-    def walk(dir_path, depth):
-        try:
-            # 检查目录是否存在且可访问
-            if not os.path.exists(dir_path) or not os.path.isdir(dir_path):
-                return
-                
-            for name in os.listdir(dir_path):
-                p = os.path.join(dir_path, name)
-                try:
-                    if os.path.isfile(p) and any(name.lower().endswith(ext) for ext in SUPPORTED_EXTS):
-                        result.append(p)
-                    elif os.path.isdir(p) and depth < max_depth:
-                        walk(p, depth + 1)
-                except Exception as e:
-                    # 记录访问失败的文件或目录
-                    error_dirs.append((p, str(e)))
-        except Exception as e:
-            # 记录无法访问的目录
-            error_dirs.append((dir_path, str(e)))
+    # 检查目录是否存在且可访问
+    if not os.path.isdir(root_dir):
+        return []
     
-    walk(root_dir, 0)
+    # 共用的并发遍历器，无法访问的目录记录到 error_dirs
+    result = list(walk_videos(root_dir, max_depth=max_depth, exts=SUPPORTED_EXTS, errors=error_dirs))
     
     # 如果有无法访问的目录，打印警告信息
     if error_dirs and len(error_dirs) <= 5:  # 限制显示的错误数量
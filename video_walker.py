@@ -0,0 +1,81 @@
+"""并发遍历目录查找视频文件
+
+使用 os.scandir 列出目录，利用 DirEntry 自带的类型信息区分目录和文件，不对每个条目
+单独 stat；各子目录在线程池中并发列出，以掩盖SMB/NFS的网络往返延迟。
+walk_videos 是生成器，找到的视频会立即产出，调用方可以一边遍历一边处理。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SUPPORTED_EXTS = [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm"]
+
+# 同时列出的目录数
+DEFAULT_WORKERS = 8
+
+
+def _scan_dir(dir_path, exts, journal=None, want_mtime=False):
+    """列出一个目录，返回 (目录修改时间, 子目录名列表, 视频文件名列表)
+
+    提供 journal 时，目录修改时间未变则直接使用日志中记录的列表。
+    """
+    mtime_ns = os.stat(dir_path).st_mtime_ns if journal or want_mtime else None
+    listing = journal.get_dir(dir_path, mtime_ns) if journal else None
+    if listing is not None:
+        return mtime_ns, listing[0], listing[1]
+
+    subdirs, videos = [], []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.name.lower().endswith(exts) and entry.is_file():
+                    videos.append(entry.name)
+            except OSError:
+                continue  # 忽略无法访问的条目
+    subdirs.sort(key=str.lower)
+    videos.sort(key=str.lower)
+    if journal:
+        journal.put_dir(dir_path, mtime_ns, subdirs, videos)
+    return mtime_ns, subdirs, videos
+
+
+def walk_videos(root_dir, max_depth=2, exts=SUPPORTED_EXTS, workers=DEFAULT_WORKERS,
+                journal=None, dir_mtimes=None, errors=None):
+    """逐个产出 root_dir 下（最多 max_depth 层子目录）的视频文件路径
+
+    journal: 可选的 BatchJournal，修改时间未变的目录不再列出
+    dir_mtimes: 可选字典，填入遍历到的每个目录的修改时间
+    errors: 可选列表，追加无法访问的目录 (路径, 错误信息)
+    """
+    exts = tuple(ext.lower() for ext in exts)
+    want_mtime = dir_mtimes is not None
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+    try:
+        pending = {pool.submit(_scan_dir, root_dir, exts, journal, want_mtime): (root_dir, 0)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_path, depth = pending.pop(future)
+                try:
+                    mtime_ns, subdirs, videos = future.result()
+                except Exception as e:
+                    if errors is not None:
+                        errors.append((dir_path, str(e)))
+                    continue
+                if want_mtime:
+                    dir_mtimes[dir_path] = mtime_ns
+                if depth < max_depth:
+                    for name in subdirs:
+                        sub_path = os.path.join(dir_path, name)
+                        pending[pool.submit(_scan_dir, sub_path, exts, journal, want_mtime)] = (sub_path, depth + 1)
+                for name in videos:
+                    yield os.path.join(dir_path, name)
+    finally:
+        # 调用方提前停止迭代时不再等待尚未开始的目录
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def collect_videos(root_dir, max_depth=2, **kwargs):
+    """一次性返回全部视频路径的列表，参数同 walk_videos"""
+    return list(walk_videos(root_dir, max_depth=max_depth, **kwargs))